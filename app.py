@@ -1,16 +1,33 @@
+import time
+_script_started = time.perf_counter()
 import streamlit as st
 import os
-import tempfile
-import anthropic
-from streamlit_mermaid import st_mermaid
-from PyPDF2 import PdfReader
+import sys
+import logging
+import multiprocessing
 from pathlib import Path
-import time
+import functools
+import hashlib
+import heapq
+import json
+import itertools
+import random
+import re
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from collections import Counter, OrderedDict, deque
+import uuid
+import zlib
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+# anthropic, numpy, PyPDF2, python-pptx, python-docx, reportlab and streamlit_mermaid are imported
+# by the functions that use them, so the upload screen starts without loading them.
+
+# Time spent importing modules for this script run, and the render budget for the upload screen
+IMPORT_SECONDS = time.perf_counter() - _script_started
+RERUN_BUDGET_MS = int(os.environ.get("PITCHME_RERUN_BUDGET_MS", "200"))
 
 # This MUST be the very first Streamlit command
 st.set_page_config(
@@ -51,9 +68,6 @@ Creative recommendations for improving the storytelling based on three approache
 - **Improvements**: "I suggest you can improve this by..."
 
 Use bold text for important points, create tables for comparing approaches, and utilize emojis to make the content more visually engaging.
-
-# Pitch Deck Content
-{pitch_deck_text}
 """
 
 STARTUP_STAGE_PROMPT = """
@@ -86,9 +100,6 @@ Create a visual roadmap showing how to get to the next stage. Use a table format
 Include 3-5 key actions the startup should take to reach the next stage.
 
 Use bold text for important points and emojis to make the content visually engaging.
-
-# Pitch Deck Content
-{pitch_deck_text}
 """
 
 MARKET_ENTRY_PROMPT = """
@@ -141,9 +152,6 @@ Provide recommendations to sharpen their customer segment focus and strengthen t
 - "I suggest you can improve this by..." (bullet points)
 
 Use emojis, bold text, and clear formatting to make the content visually engaging.
-
-# Pitch Deck Content
-{pitch_deck_text}
 """
 
 BUSINESS_MODEL_PROMPT = """
@@ -193,9 +201,6 @@ End with a visual summary table showing scores for all elements:
 | [Element] | [Score] | [Brief comment] |
 
 Also create a radar chart representation using mermaid syntax to visualize the scores across all elements.
-
-# Pitch Deck Content
-{pitch_deck_text}
 """
 
 EXPERT_PANEL_PROMPT = """
@@ -235,9 +240,6 @@ End with a panel summary showing the overall consensus, areas of agreement, and
 | [Expert] | [Recommendation] | [High/Medium/Low] |
 
 Use emojis, bold text, and clear formatting to make the content visually engaging.
-
-# Pitch Deck Content
-{pitch_deck_text}
 """
 
 OVERALL_FEEDBACK_PROMPT = """
@@ -245,7 +247,7 @@ OVERALL_FEEDBACK_PROMPT = """
 You are a Startup Mentor with expertise in pitch deck evaluation and fostering a learning mindset.
 
 # Task
-Provide comprehensive feedback on the following pitch deck.
+Provide comprehensive feedback on the pitch deck. When the analyses of the other evaluators are provided, build your feedback on their findings and stay consistent with them, using the deck excerpts for specific examples.
 
 # Output Format
 Create a visually engaging executive summary with clear markdown formatting:
@@ -276,9 +278,6 @@ Create a table with 3-5 concrete actions:
 A paragraph that encourages the team to view feedback as an opportunity for growth, emphasizing the learning mindset. Use metaphors and inspirational language that connects to the startup's mission.
 
 Use emojis, bold text, tables, and clear formatting to make the content visually engaging.
-
-# Pitch Deck Content
-{pitch_deck_text}
 """
 
 DESIGN_ANALYSIS_PROMPT = """
@@ -332,8 +331,37 @@ Organize recommendations by category:
 End with a visual "before/after" concept using mermaid syntax to illustrate key improvements.
 
 Use emojis, bold text, and clear formatting to make the content visually engaging.
+"""
+
+CHUNK_SUMMARY_PROMPT = """
+# Role
+You are an Analyst preparing a very long pitch deck for a panel of startup evaluators.
+
+# Task
+The pitch deck content provided is one part of a larger document. Condense it into a faithful summary that later analyses will read instead of the original text.
 
+# Output Format
+- Group concise bullet points under the slide or section titles
+- Keep every fact about the customer problem, solution, market, competition, business model, traction, team, financials and fundraising
+- Keep numbers, names and short direct quotes exactly as written
+- Note any references to charts, images, diagrams or other design elements
+- Do not add evaluation, advice or information that is not in the text
+"""
+
+# Shared context block holding the deck text. It is sent before the section
+# instructions above so every section request starts with the same cacheable prefix.
+DECK_CONTEXT_TEMPLATE = """
 # Pitch Deck Content
+The pitch deck to evaluate is reproduced below. The task and output format follow in the next message.
+
+{pitch_deck_text}
+"""
+
+# Context block for sections that synthesize the other analyses (see SECTION_DEPENDENCIES)
+SYNTHESIS_CONTEXT_TEMPLATE = """
+# Evaluator Analyses and Deck Excerpts
+A panel of evaluators has already analyzed the pitch deck. Condensed versions of their analyses are reproduced below, followed by the excerpts of the deck they refer to. The task and output format follow in the next message.
+
 {pitch_deck_text}
 """
 
@@ -520,8 +548,11 @@ def get_company_logo():
         # Fallback to text if image fails to load
         return st.markdown("<h3>ProtoBots.ai</h3>", unsafe_allow_html=True)
 
-# Create Anthropic client
+# Create Anthropic client. It is cached for the life of the server process so every
+# session and rerun shares one client and its HTTP connection pool.
+@st.cache_resource(show_spinner=False)
 def get_anthropic_client():
+    import anthropic
     api_key = os.environ.get("ANTHROPIC_API_KEY")
     if not api_key:
         try:
@@ -532,7 +563,8 @@ def get_anthropic_client():
     
     # Try different initialization methods for compatibility
     try:
-        return anthropic.Anthropic(api_key=api_key)
+        # Retries are handled by call_claude_api so they can share the rate limiter's backoff
+        return anthropic.Anthropic(api_key=api_key, max_retries=0)
     except Exception as e:
         try:
             return anthropic.Client(api_key=api_key)
@@ -542,132 +574,1398 @@ def get_anthropic_client():
 
 client = get_anthropic_client()
 
-# Function to call Claude API
-def call_claude_api(prompt, max_tokens=4000):
+# Default model for the analyses, and the faster, cheaper model used for short classification sections
+CLAUDE_MODEL = os.environ.get("PITCHME_MODEL", "claude-3-5-sonnet-20240620")
+CLAUDE_FAST_MODEL = os.environ.get("PITCHME_FAST_MODEL", "claude-3-haiku-20240307")
+
+# Mark the shared deck context for prompt caching (set PITCHME_PROMPT_CACHING=0 to disable)
+PROMPT_CACHING = os.environ.get("PITCHME_PROMPT_CACHING", "1") != "0"
+# Shortest prompt prefix the API will cache, by model family (other models: the default)
+PROMPT_CACHE_MIN_TOKENS = {"haiku": 2048}
+PROMPT_CACHE_DEFAULT_MIN_TOKENS = 1024
+# Longest a section waits for the first section to start writing the shared deck prefix
+PROMPT_CACHE_HOLD_SECONDS = 10.0
+
+# Shortest cacheable prompt prefix for a model
+def prompt_cache_min_tokens(model):
+    return next(
+        (tokens for family, tokens in PROMPT_CACHE_MIN_TOKENS.items() if family in model),
+        PROMPT_CACHE_DEFAULT_MIN_TOKENS
+    )
+
+# Token usage reported by the API since the process started, including prompt cache reads and writes
+# (Streamlit re-executes this file on every rerun, so state shared across sessions is
+# created through st.cache_resource instead of as plain module globals.)
+@st.cache_resource(show_spinner=False)
+def _shared_token_usage():
+    return {
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 0,
+    }, threading.Lock()
+
+TOKEN_USAGE, _token_usage_lock = _shared_token_usage()
+
+# Add the usage block of an API response to the running totals
+def record_token_usage(usage):
+    with _token_usage_lock:
+        for field in TOKEN_USAGE:
+            TOKEN_USAGE[field] += getattr(usage, field, None) or 0
+
+# Snapshot of the running token totals
+def get_token_usage():
+    with _token_usage_lock:
+        return dict(TOKEN_USAGE)
+
+# Directory for the result cache, job store and trace log
+CACHE_DIR = Path(os.environ.get("PITCHME_CACHE_DIR", Path(__file__).parent / ".pitchme_cache"))
+
+# Latency tracing: timed spans around extraction, each Claude call, rendering and the PDF export.
+# Every span is appended to a JSON-lines log and folded into in-process histograms that are
+# served in Prometheus text format on PITCHME_METRICS_PORT when it is set.
+TRACING = os.environ.get("PITCHME_TRACING", "1") != "0"
+TRACE_LOG_PATH = Path(os.environ.get("PITCHME_TRACE_LOG", CACHE_DIR / "traces.jsonl"))
+TRACE_LOG_MAX_BYTES = 50 * 1024 * 1024
+# Histogram bucket bounds in seconds, and recent samples kept per series for p50/p95
+TRACE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TRACE_SAMPLES = 1000
+# Span attributes that are token counts, exported as pitchme_tokens_total by kind
+TRACE_TOKEN_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# Histograms and counters of the finished spans, plus the lock guarding them and the log file
+@st.cache_resource(show_spinner=False)
+def _shared_trace_metrics():
+    return {"histograms": {}, "counters": {}}, threading.Lock()
+
+TRACE_METRICS, _trace_lock = _shared_trace_metrics()
+
+def _observe(metric, labels, seconds):
+    series = TRACE_METRICS["histograms"].setdefault((metric, labels), {
+        "count": 0, "sum": 0.0, "buckets": [0] * len(TRACE_BUCKETS), "samples": deque(maxlen=TRACE_SAMPLES)
+    })
+    series["count"] += 1
+    series["sum"] += seconds
+    for i, bound in enumerate(TRACE_BUCKETS):
+        if seconds <= bound:
+            series["buckets"][i] += 1
+    series["samples"].append(seconds)
+
+def _count(metric, labels, value=1):
+    TRACE_METRICS["counters"][(metric, labels)] = TRACE_METRICS["counters"].get((metric, labels), 0) + value
+
+# Append a finished span to the trace log, rotating it to .1 when it grows too large
+def _write_trace(record):
+    try:
+        TRACE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        if TRACE_LOG_PATH.exists() and TRACE_LOG_PATH.stat().st_size > TRACE_LOG_MAX_BYTES:
+            TRACE_LOG_PATH.replace(TRACE_LOG_PATH.with_name(TRACE_LOG_PATH.name + ".1"))
+        with open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass
+
+# Time a block of work. The yielded dict holds the span's attributes, and the block can add
+# to it (section, ttft_ms, retries, token counts...). Exceptions mark the span as an error.
+@contextmanager
+def trace_span(name, **attributes):
+    span = dict(attributes, status="ok")
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        if span["status"] == "ok":
+            span["status"] = "error"
+        raise
+    finally:
+        if TRACING:
+            seconds = time.perf_counter() - started
+            labels = (name, str(span.get("section") or ""))
+            with _trace_lock:
+                _observe("span_seconds", labels, seconds)
+                if span.get("ttft_ms") is not None:
+                    _observe("ttft_seconds", labels, span["ttft_ms"] / 1000)
+                if span.get("retries"):
+                    _count("retries_total", labels, span["retries"])
+                if span["status"] != "ok":
+                    _count("errors_total", labels)
+                for field in TRACE_TOKEN_FIELDS:
+                    if span.get(field):
+                        _count("tokens_total", labels + (field,), span[field])
+                _write_trace({"span": name, "ts": round(started_at, 3), "duration_ms": round(seconds * 1000, 1), **span})
+
+# p50/p95 latency and time to first token per span and section, from the recent samples
+def get_trace_summary():
+    def percentile(values, q):
+        return values[min(len(values) - 1, int(len(values) * q))]
+    summary = []
+    with _trace_lock:
+        histograms = {key: sorted(series["samples"]) for key, series in TRACE_METRICS["histograms"].items()}
+    for (metric, labels), samples in sorted(histograms.items()):
+        if metric != "span_seconds" or not samples:
+            continue
+        ttft = histograms.get(("ttft_seconds", labels))
+        summary.append({
+            "span": labels[0],
+            "section": labels[1],
+            "count": len(samples),
+            "p50": percentile(samples, 0.5),
+            "p95": percentile(samples, 0.95),
+            "ttft_p50": percentile(ttft, 0.5) if ttft else None,
+            "ttft_p95": percentile(ttft, 0.95) if ttft else None,
+        })
+    return summary
+
+# All span metrics in the Prometheus text exposition format
+def prometheus_metrics():
+    def label_text(names, values):
+        return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+    lines = []
+    with _trace_lock:
+        histograms = sorted(TRACE_METRICS["histograms"].items())
+        counters = sorted(TRACE_METRICS["counters"].items())
+        for metric in ("span_seconds", "ttft_seconds"):
+            lines.append(f"# TYPE pitchme_{metric} histogram")
+            for (name, labels), series in histograms:
+                if name != metric:
+                    continue
+                bucket_names = ("span", "section", "le")
+                for bound, count in zip(TRACE_BUCKETS, series["buckets"]):
+                    lines.append(f"pitchme_{metric}_bucket{label_text(bucket_names, labels + (bound,))} {count}")
+                lines.append(f"pitchme_{metric}_bucket{label_text(bucket_names, labels + ('+Inf',))} {series['count']}")
+                lines.append(f"pitchme_{metric}_sum{label_text(('span', 'section'), labels)} {series['sum']:.6f}")
+                lines.append(f"pitchme_{metric}_count{label_text(('span', 'section'), labels)} {series['count']}")
+        for metric, label_names in (("retries_total", ("span", "section")),
+                                    ("errors_total", ("span", "section")),
+                                    ("tokens_total", ("span", "section", "kind"))):
+            lines.append(f"# TYPE pitchme_{metric} counter")
+            for (name, labels), value in counters:
+                if name == metric:
+                    lines.append(f"pitchme_{metric}{label_text(label_names, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+# Serve prometheus_metrics() at /metrics on PITCHME_METRICS_PORT, once per process
+@st.cache_resource(show_spinner=False)
+def _metrics_server():
+    port = os.environ.get("PITCHME_METRICS_PORT")
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
     try:
-        # Try newer API first
-        if hasattr(client, 'messages'):
-            message = client.messages.create(
-                model="claude-3-5-sonnet-20240620",
-                max_tokens=max_tokens,
-                messages=[{"role": "user", "content": prompt}]
+        server = ThreadingHTTPServer(("0.0.0.0", int(port)), MetricsHandler)
+    except (OSError, ValueError) as e:
+        logging.getLogger(__name__).warning("Could not start the metrics endpoint on port %s: %s", port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="pitchme-metrics", daemon=True).start()
+    return server
+
+_metrics_server()
+
+# Build the system blocks and user instructions for one section, deck text first
+def build_section_request(pitch_deck_text, instructions, context_template=None):
+    if context_template is None:
+        context_template = DECK_CONTEXT_TEMPLATE
+    deck_block = {"type": "text", "text": context_template.format(pitch_deck_text=pitch_deck_text).strip()}
+    if PROMPT_CACHING:
+        deck_block["cache_control"] = {"type": "ephemeral"}
+    return [deck_block], instructions.strip()
+
+# Client-side limits shared by every session and batch run, kept below the account's API limits
+RATE_LIMIT_REQUESTS_PER_MINUTE = int(os.environ.get("PITCHME_RATE_LIMIT_RPM", "50"))
+RATE_LIMIT_TOKENS_PER_MINUTE = int(os.environ.get("PITCHME_RATE_LIMIT_TPM", "80000"))
+# Retries for rate-limited, overloaded or dropped requests, with jittered exponential backoff
+MAX_API_RETRIES = int(os.environ.get("PITCHME_MAX_API_RETRIES", "5"))
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 60.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Waiting calls are served lowest priority value first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+DEFAULT_CALL_PRIORITY = PRIORITY_INTERACTIVE
+
+# Bucket state and waiting callers are kept in a SQLite store so the app and batch.py, which run
+# as separate processes, share one budget. A process's queued callers count as waiting for this long.
+RATE_LIMIT_PATH = CACHE_DIR / "rate_limit.sqlite3"
+RATE_LIMIT_WAITER_SECONDS = 5.0
+# Longest a waiting caller goes without re-reading the shared bucket
+RATE_LIMIT_POLL_SECONDS = 1.0
+
+# Token-bucket limiter on requests/min and tokens/min, shared with other processes through
+# RATE_LIMIT_PATH. Callers queue in priority order, and a caller doesn't take from the bucket
+# while another process has a higher-priority caller waiting, so interactive sessions are
+# served before batch work waiting at the same time.
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute, path=RATE_LIMIT_PATH):
+        self.request_capacity = requests_per_minute
+        self.token_capacity = tokens_per_minute
+        self.path = Path(path)
+        self.process = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.paused_until = 0.0
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._conn = None
+
+    # Connection to the shared store, used only while holding the condition's lock
+    def _store(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), requests REAL NOT NULL, tokens REAL NOT NULL, "
+                "updated REAL NOT NULL, paused_until REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS waiters (process TEXT PRIMARY KEY, priority INTEGER NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO bucket (id, requests, tokens, updated, paused_until) VALUES (0, ?, ?, ?, 0)",
+                (self.request_capacity, self.token_capacity, time.time())
+            )
+            self._conn = conn
+        return self._conn
+
+    # Run `update(requests, tokens, paused_until, now)` on the refilled shared bucket in one
+    # transaction. It returns the new (requests, tokens, paused_until) and a result to pass on.
+    def _transact(self, update):
+        conn = self._store()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            requests, tokens, updated, paused_until = conn.execute(
+                "SELECT requests, tokens, updated, paused_until FROM bucket WHERE id = 0"
+            ).fetchone()
+            elapsed = max(0.0, now - updated)
+            requests = min(self.request_capacity, requests + elapsed * self.request_capacity / 60)
+            tokens = min(self.token_capacity, tokens + elapsed * self.token_capacity / 60)
+            (requests, tokens, paused_until), result = update(conn, requests, tokens, paused_until, now)
+            conn.execute(
+                "UPDATE bucket SET requests = ?, tokens = ?, updated = ?, paused_until = ? WHERE id = 0",
+                (requests, tokens, now, paused_until)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.paused_until = paused_until
+        return result
+
+    # Advertise the best priority waiting in this process, or withdraw it when nobody waits
+    def _publish_waiters(self, conn, now):
+        if self._waiting:
+            conn.execute(
+                "INSERT OR REPLACE INTO waiters (process, priority, updated) VALUES (?, ?, ?)",
+                (self.process, self._waiting[0][0], now)
             )
-            return message.content[0].text
-        # Fall back to older API
         else:
-            response = client.completion(
-                prompt=f"\n\nHuman: {prompt}\n\nAssistant:",
-                model="claude-3-5-sonnet-20240620",
-                max_tokens_to_sample=max_tokens,
-                stop_sequences=["\n\nHuman:"]
+            conn.execute("DELETE FROM waiters WHERE process = ?", (self.process,))
+
+    # Transaction body that only brings this process's waiter entry up to date
+    def _refresh_waiters(self, conn, requests, tokens, paused_until, now):
+        self._publish_waiters(conn, now)
+        return (requests, tokens, paused_until), None
+
+    # Take a request and `tokens` from the bucket if possible; returns the seconds to wait otherwise
+    def _try_take(self, tokens, priority):
+        def update(conn, requests, available, paused_until, now):
+            self._publish_waiters(conn, now)
+            ahead = conn.execute(
+                "SELECT MIN(priority) FROM waiters WHERE process != ? AND updated > ?",
+                (self.process, now - RATE_LIMIT_WAITER_SECONDS)
+            ).fetchone()[0]
+            if ahead is not None and ahead < priority:
+                return (requests, available, paused_until), RATE_LIMIT_POLL_SECONDS
+            delay = max(
+                paused_until - now,
+                (1 - requests) * 60 / self.request_capacity,
+                (tokens - available) * 60 / self.token_capacity
             )
-            return response.completion
-    except Exception as e:
-        st.error(f"Error calling Claude API: {str(e)}")
+            if delay <= 0:
+                return (requests - 1, available - tokens, paused_until), 0.0
+            return (requests, available, paused_until), delay
+        return self._transact(update)
+
+    # Block until a request using `tokens` tokens may be sent; returns the seconds waited
+    def acquire(self, tokens, priority=PRIORITY_INTERACTIVE):
+        tokens = min(tokens, self.token_capacity)
+        started = time.monotonic()
+        ticket = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] != ticket:
+                        self._condition.wait(RATE_LIMIT_POLL_SECONDS)
+                        continue
+                    delay = self._try_take(tokens, priority)
+                    if delay <= 0:
+                        break
+                    # Other processes take from the bucket too, so re-read it at least every poll interval
+                    self._condition.wait(min(delay, RATE_LIMIT_POLL_SECONDS))
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._transact(self._refresh_waiters)
+                waited = time.monotonic() - started
+                self.acquired += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                self._condition.notify_all()
+        return waited
+
+    # Correct the token bucket once the real usage of a request is known
+    def settle(self, reserved_tokens, used_tokens):
+        with self._condition:
+            self._transact(lambda conn, requests, tokens, paused_until, now: (
+                (requests, min(self.token_capacity, tokens + reserved_tokens - used_tokens), paused_until), None
+            ))
+            self._condition.notify_all()
+
+    # Hold back every caller, in every process, after the API has told us to slow down
+    def pause(self, seconds):
+        with self._condition:
+            self._transact(lambda conn, requests, tokens, paused_until, now: (
+                (requests, tokens, max(paused_until, now + seconds)), None
+            ))
+            self.throttled += 1
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "queue_depth": len(self._waiting),
+                "average_wait": self.total_wait / self.acquired if self.acquired else 0.0,
+                "max_wait": self.max_wait,
+                "throttled": self.throttled,
+                "paused_for": max(0.0, self.paused_until - time.time()),
+            }
+
+@st.cache_resource(show_spinner=False)
+def _shared_rate_limiter():
+    return RateLimiter(RATE_LIMIT_REQUESTS_PER_MINUTE, RATE_LIMIT_TOKENS_PER_MINUTE)
+
+RATE_LIMITER = _shared_rate_limiter()
+
+# Queue depth, wait times and throttling events of the shared rate limiter
+def get_rate_limiter_stats():
+    return RATE_LIMITER.stats()
+
+# Raised by call_claude_api when a request fails for good: an error that is not retried, or
+# one still failing after MAX_API_RETRIES. The message carries the API's own error text, and
+# `retryable` tells whether the same request may succeed later (overload, connection error)
+# or never will (rejected key, bad request).
+class ClaudeAPIError(Exception):
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+# Seconds to wait before retrying a failed request, or None if it should not be retried
+def _retry_delay(error, attempt):
+    import anthropic
+    status = getattr(error, "status_code", None)
+    connection_error = isinstance(error, getattr(anthropic, "APIConnectionError", ()))
+    if status not in RETRYABLE_STATUS_CODES and not connection_error:
         return None
+    delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        delay = max(delay, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+# Send one request to Claude and return its text, usage, seconds to the first streamed token
+# (None when not streaming) and stop reason, streaming to on_text when given
+def _send_claude_request(prompt, max_tokens, model, system, on_text, temperature=None):
+    # Try newer API first
+    if hasattr(client, 'messages'):
+        request = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if system:
+            request["system"] = system
+        if temperature is not None:
+            request["temperature"] = temperature
+        if on_text and hasattr(client.messages, 'stream'):
+            chunks = []
+            first_token = None
+            started = time.perf_counter()
+            with client.messages.stream(**request) as stream:
+                for text in stream.text_stream:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    chunks.append(text)
+                    on_text("".join(chunks))
+                message = stream.get_final_message()
+            return "".join(chunks), getattr(message, "usage", None), first_token, getattr(message, "stop_reason", None)
+        message = client.messages.create(**request)
+        return message.content[0].text, getattr(message, "usage", None), None, getattr(message, "stop_reason", None)
+    # Fall back to older API
+    else:
+        if system:
+            prompt = "\n\n".join(block["text"] for block in system) + "\n\n" + prompt
+        response = client.completion(
+            prompt=f"\n\nHuman: {prompt}\n\nAssistant:",
+            model=model,
+            max_tokens_to_sample=max_tokens,
+            stop_sequences=["\n\nHuman:"],
+            **({"temperature": temperature} if temperature is not None else {})
+        )
+        return response.completion, None, None, getattr(response, "stop_reason", None)
+
+# Function to call Claude API. When on_text is given the response is streamed and
+# on_text is called with the text accumulated so far as new tokens arrive.
+# Each call is traced as a "claude_call" span labelled with `section`, checked against the
+# spending budgets before it is sent, and recorded in the usage ledger.
+def call_claude_api(prompt, max_tokens=4000, model=CLAUDE_MODEL, system=None, on_text=None, priority=None,
+                    temperature=None, section=None):
+    if priority is None:
+        priority = DEFAULT_CALL_PRIORITY
+    system_chars = sum(len(block["text"]) for block in system) if system else 0
+    input_estimate = (system_chars + len(prompt)) // CHARS_PER_TOKEN
+    reserved_tokens = input_estimate + max_tokens
+    with trace_span("claude_call", section=section, model=model, retries=0, queue_ms=0.0) as span:
+        reservation, refusal = reserve_budget(model, input_estimate, max_tokens)
+        if refusal:
+            span["status"] = "over_budget"
+            raise BudgetExceeded(refusal)
+        try:
+            for attempt in range(MAX_API_RETRIES + 1):
+                span["retries"] = attempt
+                queued = time.perf_counter()
+                RATE_LIMITER.acquire(reserved_tokens, priority)
+                span["queue_ms"] += round((time.perf_counter() - queued) * 1000, 1)
+                try:
+                    text, usage, first_token, stop_reason = _send_claude_request(
+                        prompt, max_tokens, model, system, on_text, temperature
+                    )
+                except Exception as e:
+                    RATE_LIMITER.settle(reserved_tokens, 0)
+                    delay = _retry_delay(e, attempt)
+                    if delay is None or attempt == MAX_API_RETRIES:
+                        span["status"] = "error"
+                        span["error"] = str(e)
+                        logging.getLogger(__name__).error("Error calling Claude API: %s", e)
+                        raise ClaudeAPIError(f"Error calling Claude API: {str(e)}", delay is not None) from e
+                    if getattr(e, "status_code", None) in (429, 529):
+                        RATE_LIMITER.pause(delay)
+                    else:
+                        time.sleep(delay)
+                    continue
+                if first_token is not None:
+                    span["ttft_ms"] = round(first_token * 1000, 1)
+                used_tokens = reserved_tokens
+                if usage is not None:
+                    record_token_usage(usage)
+                    span.update({field: getattr(usage, field, None) or 0 for field in TRACE_TOKEN_FIELDS})
+                    used_tokens = sum(
+                        getattr(usage, field, None) or 0
+                        for field in ("input_tokens", "cache_creation_input_tokens", "output_tokens")
+                    )
+                RATE_LIMITER.settle(reserved_tokens, used_tokens)
+                output_tokens = getattr(usage, "output_tokens", None) or -(-len(text) // CHARS_PER_TOKEN)
+                span["cost_usd"] = record_ledger_usage(section, model, usage, input_estimate, output_tokens)
+                if section:
+                    record_section_output(section, model, max_tokens, output_tokens, stop_reason)
+                return text
+        finally:
+            release_budget(reservation)
+
+# Usage ledger: tokens and cost of every Claude call by section, session, evaluation and deck,
+# kept in a local SQLite database and checked against the spending budgets before each call
+LEDGER_PATH = CACHE_DIR / "ledger.sqlite3"
+# Spending limits in USD per browser session and per UTC day (0 disables a limit)
+SESSION_BUDGET_USD = float(os.environ.get("PITCHME_SESSION_BUDGET_USD", "0"))
+DAILY_BUDGET_USD = float(os.environ.get("PITCHME_DAILY_BUDGET_USD", "0"))
+# USD per million tokens: input, output, prompt cache writes and prompt cache reads.
+# Override or extend with PITCHME_MODEL_PRICES, a JSON object in the same shape.
+MODEL_PRICES = {
+    "claude-3-5-sonnet-20240620": {"input": 3.0, "output": 15.0, "cache_write": 3.75, "cache_read": 0.30},
+    "claude-3-haiku-20240307": {"input": 0.25, "output": 1.25, "cache_write": 0.30, "cache_read": 0.03},
+}
+try:
+    MODEL_PRICES.update(json.loads(os.environ.get("PITCHME_MODEL_PRICES", "{}")))
+except json.JSONDecodeError as e:
+    logging.getLogger(__name__).warning("Ignoring PITCHME_MODEL_PRICES: %s", e)
+
+# Who the calls made in this context are billed to: session, evaluation and deck hash.
+# Set around an evaluation with ledger_context() and copied into its worker threads.
+_usage_context = contextvars.ContextVar("pitchme_usage_context", default={})
+
+@contextmanager
+def ledger_context(**context):
+    token = _usage_context.set(dict(_usage_context.get(), **context))
+    try:
+        yield
+    finally:
+        _usage_context.reset(token)
+
+# Short hash identifying a deck in the ledger, insensitive to whitespace differences
+def deck_hash(pitch_deck_text):
+    return hashlib.sha256(normalize_deck_text(pitch_deck_text).encode("utf-8")).hexdigest()[:16]
+
+# Create the ledger database and its tables, once per process
+@st.cache_resource(show_spinner=False)
+def _create_ledger():
+    LEDGER_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(LEDGER_PATH, timeout=30)) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            "ts REAL NOT NULL, day TEXT NOT NULL, session TEXT, evaluation TEXT, deck TEXT, "
+            "section TEXT, model TEXT NOT NULL, input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, "
+            "cache_creation_input_tokens INTEGER NOT NULL, cache_read_input_tokens INTEGER NOT NULL, "
+            "cost_usd REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS usage_day ON usage (day)")
+        conn.execute("CREATE INDEX IF NOT EXISTS usage_session ON usage (session)")
+        conn.execute("CREATE INDEX IF NOT EXISTS usage_evaluation ON usage (evaluation)")
+    return True
+
+# Open the ledger database
+def _open_ledger():
+    _create_ledger()
+    return sqlite3.connect(LEDGER_PATH, timeout=30)
+
+def _ledger_day(ts=None):
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+# Cost in USD of a call's token counts, priced as the default model when the model is unknown
+def token_cost(model, input_tokens=0, output_tokens=0, cache_creation_input_tokens=0, cache_read_input_tokens=0):
+    prices = MODEL_PRICES.get(model) or MODEL_PRICES[CLAUDE_MODEL]
+    return (
+        input_tokens * prices["input"]
+        + output_tokens * prices["output"]
+        + cache_creation_input_tokens * prices["cache_write"]
+        + cache_read_input_tokens * prices["cache_read"]
+    ) / 1_000_000
+
+# Estimated cost of calls that passed the budget check but have not been recorded yet,
+# so concurrent calls cannot all slip under the same limit
+@st.cache_resource(show_spinner=False)
+def _shared_budget_reservations():
+    return {}, threading.Lock()
+
+_budget_reservations, _budget_lock = _shared_budget_reservations()
+
+# Spend recorded so far today and in one session
+def _ledger_spend(session):
+    try:
+        with closing(_open_ledger()) as conn:
+            today = conn.execute("SELECT COALESCE(SUM(cost_usd), 0) FROM usage WHERE day = ?", (_ledger_day(),)).fetchone()[0]
+            in_session = conn.execute(
+                "SELECT COALESCE(SUM(cost_usd), 0) FROM usage WHERE session = ?", (session,)
+            ).fetchone()[0] if session else 0.0
+    except sqlite3.Error:
+        return 0.0, 0.0
+    return today, in_session
+
+# Raised by call_claude_api when a call would go over a budget. It is not retried: the
+# evaluation stops the section and reports the message as the reason it failed.
+class BudgetExceeded(Exception):
+    pass
+
+# Message saying which budget has no room left for a call costing up to `estimate` on top of the
+# recorded spend and the pending reservations, or None if it fits. The message says whether waiting
+# helps: reservations are released within minutes, the daily spend resets tomorrow, and a call
+# that costs more than the whole budget never fits.
+def _budget_refusal(session, today, in_session, estimate, pending_today=0.0, pending_session=0.0):
+    budgets = []
+    if DAILY_BUDGET_USD:
+        budgets.append((f"the daily API budget of ${DAILY_BUDGET_USD:.2f}", DAILY_BUDGET_USD, today, pending_today,
+                        "spent today", "Please try again tomorrow."))
+    if SESSION_BUDGET_USD and session:
+        budgets.append((f"this session's API budget of ${SESSION_BUDGET_USD:.2f}", SESSION_BUDGET_USD, in_session,
+                        pending_session, "spent in this session", "No more analyses can run in this session."))
+    for name, budget, spent, pending, spent_label, later in budgets:
+        if spent + pending + estimate <= budget:
+            continue
+        if estimate > budget:
+            return f"A single analysis can cost up to ${estimate:.3f}, more than {name} allows."
+        if spent + estimate <= budget:
+            later = "Please try again in a few minutes, once the analyses in progress have finished."
+        return (
+            f"There is no room left in {name}: ${spent:.3f} {spent_label}, ${pending:.3f} reserved by analyses "
+            f"in progress and up to ${estimate:.3f} for this one. {later}"
+        )
+    return None
+
+# Check a call's worst-case cost (estimated input plus the full max_tokens of output) against
+# the budgets. Returns a reservation to release after the call, and an error message if refused.
+def reserve_budget(model, input_tokens, max_tokens):
+    if not DAILY_BUDGET_USD and not SESSION_BUDGET_USD:
+        return None, None
+    session = _usage_context.get().get("session")
+    estimate = token_cost(model, input_tokens=input_tokens, output_tokens=max_tokens)
+    with _budget_lock:
+        today, in_session = _ledger_spend(session)
+        pending_today = sum(cost for _, cost in _budget_reservations.values())
+        pending_session = sum(cost for owner, cost in _budget_reservations.values() if session and owner == session)
+        refusal = _budget_refusal(session, today, in_session, estimate, pending_today, pending_session)
+        if refusal:
+            return None, refusal
+        reservation = uuid.uuid4().hex
+        _budget_reservations[reservation] = (session, estimate)
+    return reservation, None
+
+def release_budget(reservation):
+    if reservation is not None:
+        with _budget_lock:
+            _budget_reservations.pop(reservation, None)
+
+# Record one call in the ledger and return its cost. Without a usage block (older API)
+# the token counts are estimated from the text lengths.
+def record_ledger_usage(section, model, usage, input_estimate, output_estimate):
+    if usage is not None:
+        tokens = {field: getattr(usage, field, None) or 0 for field in TRACE_TOKEN_FIELDS}
+    else:
+        tokens = dict.fromkeys(TRACE_TOKEN_FIELDS, 0)
+        tokens.update(input_tokens=input_estimate, output_tokens=output_estimate)
+    cost = token_cost(model, **tokens)
+    context = _usage_context.get()
+    now = time.time()
+    try:
+        with closing(_open_ledger()) as conn, conn:
+            conn.execute(
+                "INSERT INTO usage (ts, day, session, evaluation, deck, section, model, input_tokens, output_tokens, "
+                "cache_creation_input_tokens, cache_read_input_tokens, cost_usd) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now, _ledger_day(now), context.get("session"), context.get("evaluation"), context.get("deck"),
+                 section, model, tokens["input_tokens"], tokens["output_tokens"],
+                 tokens["cache_creation_input_tokens"], tokens["cache_read_input_tokens"], cost)
+            )
+    except sqlite3.Error:
+        pass
+    return round(cost, 6)
 
-# Extract text from various file formats
-def extract_text_from_file(uploaded_file):
+# Total cost of one evaluation
+def get_evaluation_cost(evaluation):
+    try:
+        with closing(_open_ledger()) as conn:
+            return conn.execute(
+                "SELECT COALESCE(SUM(cost_usd), 0) FROM usage WHERE evaluation = ?", (evaluation,)
+            ).fetchone()[0]
+    except sqlite3.Error:
+        return 0.0
+
+# Spend summary for the usage view: today, this session, and cost per section and per
+# recent evaluation over the last `days` days
+def get_ledger_summary(session=None, days=7):
+    summary = {"today": 0.0, "session": 0.0, "by_section": [], "by_evaluation": []}
+    since = time.time() - days * 24 * 3600
+    summary["today"], summary["session"] = _ledger_spend(session)
+    try:
+        with closing(_open_ledger()) as conn:
+            summary["by_section"] = [
+                {"section": section or "other", "calls": calls, "input_tokens": input_tokens,
+                 "output_tokens": output_tokens, "cost_usd": cost, "average_usd": cost / calls}
+                for section, calls, input_tokens, output_tokens, cost in conn.execute(
+                    "SELECT section, COUNT(*), SUM(input_tokens + cache_creation_input_tokens + cache_read_input_tokens), "
+                    "SUM(output_tokens), SUM(cost_usd) FROM usage WHERE ts >= ? GROUP BY section ORDER BY SUM(cost_usd) DESC",
+                    (since,)
+                )
+            ]
+            summary["by_evaluation"] = [
+                {"evaluation": evaluation_id, "deck": deck, "calls": calls, "cost_usd": cost, "started": started}
+                for evaluation_id, deck, calls, cost, started in conn.execute(
+                    "SELECT evaluation, MAX(deck), COUNT(*), SUM(cost_usd), MIN(ts) FROM usage "
+                    "WHERE ts >= ? AND evaluation IS NOT NULL GROUP BY evaluation ORDER BY MIN(ts) DESC LIMIT 20",
+                    (since,)
+                )
+            ]
+    except sqlite3.Error:
+        pass
+    return summary
+
+# Persistent cache of section results, shared by every session and process on this machine
+RESULT_CACHE_PATH = CACHE_DIR / "results.sqlite3"
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("PITCHME_CACHE_MAX_ENTRIES", "2000"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("PITCHME_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+RESULT_CACHE_MAX_AGE = int(os.environ.get("PITCHME_CACHE_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+
+# Create the result cache database and its tables, once per process
+@st.cache_resource(show_spinner=False)
+def _create_result_cache():
+    RESULT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(RESULT_CACHE_PATH, timeout=30)) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS section_outputs ("
+            "section TEXT NOT NULL, model TEXT NOT NULL, max_tokens INTEGER NOT NULL, "
+            "output_tokens INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS section_outputs_section ON section_outputs (section, created)")
+        # Added after the table: whether the answer stopped at max_tokens (NULL when unknown)
+        if "hit_limit" not in {row[1] for row in conn.execute("PRAGMA table_info(section_outputs)")}:
+            conn.execute("ALTER TABLE section_outputs ADD COLUMN hit_limit INTEGER")
+    return True
+
+# Open the result cache database
+def _open_result_cache():
+    _create_result_cache()
+    return sqlite3.connect(RESULT_CACHE_PATH, timeout=30)
+
+# Normalize extracted text so whitespace-only differences share a cache entry
+def normalize_deck_text(pitch_deck_text):
+    return "\n".join(" ".join(line.split()) for line in pitch_deck_text.splitlines() if line.strip())
+
+# Build the content-addressed cache key for one section analysis
+def result_cache_key(pitch_deck_text, prompt_template, model, max_tokens, temperature=None):
+    digest = hashlib.sha256()
+    parts = [normalize_deck_text(pitch_deck_text), prompt_template, model, str(max_tokens)]
+    # Only an explicit temperature is part of the key, so entries made with the API default stay valid
+    if temperature is not None:
+        parts.append(f"temperature={temperature}")
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _bump_cache_counter(conn, name):
+    conn.execute(
+        "INSERT INTO counters (name, value) VALUES (?, 1) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+        (name,)
+    )
+
+# Look up a cached result, returning None on a miss or an expired entry. A repeated lookup
+# of the same request passes count_miss=False so one request is counted as one miss.
+def result_cache_get(key, count_miss=True):
+    try:
+        with closing(_open_result_cache()) as conn, conn:
+            now = time.time()
+            row = conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= RESULT_CACHE_MAX_AGE:
+                conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                _bump_cache_counter(conn, "hits")
+                return row[0]
+            if row:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            if count_miss:
+                _bump_cache_counter(conn, "misses")
+    except sqlite3.Error:
+        pass
+    return None
+
+# Store a result and evict expired and least recently used entries beyond the limits
+def result_cache_put(key, value):
+    try:
+        with closing(_open_result_cache()) as conn, conn:
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            conn.execute("DELETE FROM results WHERE created < ?", (now - RESULT_CACHE_MAX_AGE,))
+            count, total_size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            if count > RESULT_CACHE_MAX_ENTRIES or total_size > RESULT_CACHE_MAX_BYTES:
+                for old_key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+                    if count <= RESULT_CACHE_MAX_ENTRIES and total_size <= RESULT_CACHE_MAX_BYTES:
+                        break
+                    conn.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                    count -= 1
+                    total_size -= size
+                    _bump_cache_counter(conn, "evictions")
+    except sqlite3.Error:
+        pass
+
+# Hit/miss counters and current size of the result cache
+def get_result_cache_stats():
+    stats = {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0}
+    try:
+        with closing(_open_result_cache()) as conn:
+            stats.update(dict(conn.execute("SELECT name, value FROM counters").fetchall()))
+            stats["entries"], stats["bytes"] = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+    except sqlite3.Error:
+        pass
+    return stats
+
+# Output-length samples kept per section for tuning the routing table's token budgets
+SECTION_OUTPUT_SAMPLES = 500
+
+# Record the output tokens of a freshly generated section and whether it stopped at max_tokens,
+# keeping the latest samples
+def record_section_output(section, model, max_tokens, output_tokens, stop_reason=None):
+    hit_limit = None if stop_reason is None else int(stop_reason == "max_tokens")
+    try:
+        with closing(_open_result_cache()) as conn, conn:
+            conn.execute(
+                "INSERT INTO section_outputs (section, model, max_tokens, output_tokens, created, hit_limit) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (section, model, max_tokens, output_tokens, time.time(), hit_limit)
+            )
+            conn.execute(
+                "DELETE FROM section_outputs WHERE section = ? AND rowid NOT IN ("
+                "SELECT rowid FROM section_outputs WHERE section = ? ORDER BY created DESC LIMIT ?)",
+                (section, section, SECTION_OUTPUT_SAMPLES)
+            )
+    except sqlite3.Error:
+        pass
+
+# Observed output lengths per section: sample count, mean, median, 95th percentile, maximum,
+# how often the answer was cut off at max_tokens, and a budget suggested from the 95th percentile.
+# Samples recorded without a stop reason count as cut off when they came within 5% of the limit.
+def get_section_output_stats():
+    samples = {}
+    try:
+        with closing(_open_result_cache()) as conn:
+            for section, max_tokens, output_tokens, hit_limit in conn.execute(
+                "SELECT section, max_tokens, output_tokens, hit_limit FROM section_outputs"
+            ):
+                if hit_limit is None:
+                    hit_limit = output_tokens >= 0.95 * max_tokens
+                samples.setdefault(section, []).append((output_tokens, bool(hit_limit)))
+    except sqlite3.Error:
+        pass
+    stats = {}
+    for section, rows in samples.items():
+        lengths = sorted(length for length, _ in rows)
+        p95 = lengths[min(len(lengths) - 1, int(len(lengths) * 0.95))]
+        stats[section] = {
+            "count": len(lengths),
+            "mean": sum(lengths) / len(lengths),
+            "p50": lengths[len(lengths) // 2],
+            "p95": p95,
+            "max": lengths[-1],
+            "hit_limit": sum(1 for _, hit_limit in rows if hit_limit) / len(rows),
+            "suggested_max_tokens": max(500, -(-int(p95 * 1.25) // 250) * 250),
+        }
+    return stats
+
+# One section call in flight, shared by every session that asks for the same analysis while it runs.
+# Followers replay the leader's streamed text from their own thread, so each session only
+# ever writes to its own page.
+class _InFlightCall:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.text = ""
+        self.version = 0
+        self.done = False
+        self.result = None
+
+    # Called by the leader with the text streamed so far
+    def publish(self, text):
+        with self.condition:
+            self.text = text
+            self.version += 1
+            self.condition.notify_all()
+
+    def finish(self, result):
+        with self.condition:
+            self.result = result
+            self.done = True
+            self.condition.notify_all()
+
+    # Wait for the leader's result, passing the streamed text to on_text as it arrives
+    def wait(self, on_text=None):
+        seen = 0
+        while True:
+            with self.condition:
+                while not self.done and self.version == seen:
+                    self.condition.wait()
+                text, seen, done = self.text, self.version, self.done
+            if done:
+                return self.result
+            if on_text:
+                on_text(text)
+
+# In-flight calls keyed like the result cache (deck, prompt, model and token limit), shared
+# across sessions, plus how many calls led and how many joined an identical one
+@st.cache_resource(show_spinner=False)
+def _shared_in_flight_calls():
+    return {}, threading.Lock(), {"leaders": 0, "followers": 0}
+
+IN_FLIGHT_CALLS, _in_flight_lock, SINGLE_FLIGHT_STATS = _shared_in_flight_calls()
+
+# Snapshot of the single-flight counters
+def get_single_flight_stats():
+    with _in_flight_lock:
+        return dict(SINGLE_FLIGHT_STATS, in_flight=len(IN_FLIGHT_CALLS))
+
+# Call Claude for one section, serving repeated decks from the result cache. Identical
+# requests that arrive while the first one is still running wait for it instead of
+# sending their own call, and receive its streamed tokens and result.
+# `section` names the analysis in the output-length stats; `context_template` replaces
+# DECK_CONTEXT_TEMPLATE for inputs that are not the deck itself.
+def cached_claude_api(pitch_deck_text, prompt_template, max_tokens=4000, model=CLAUDE_MODEL, on_text=None,
+                      temperature=None, section=None, context_template=None):
+    key = result_cache_key(pitch_deck_text, prompt_template, model, max_tokens, temperature)
+    cached = result_cache_get(key)
+    if cached is not None:
+        if on_text:
+            on_text(cached)
+        return cached
+
+    with _in_flight_lock:
+        call = IN_FLIGHT_CALLS.get(key)
+        leader = call is None
+        if leader:
+            call = IN_FLIGHT_CALLS[key] = _InFlightCall()
+            SINGLE_FLIGHT_STATS["leaders"] += 1
+        else:
+            SINGLE_FLIGHT_STATS["followers"] += 1
+    if not leader:
+        return call.wait(on_text)
+
+    # The leader always streams, so sessions joining mid-call can follow along
+    def stream(text):
+        call.publish(text)
+        if on_text:
+            on_text(text)
+
+    result = None
+    try:
+        # A leader that just finished may have stored the result after our cache miss and left
+        # the table before we took the lock, so check the cache once more before calling
+        result = result_cache_get(key, count_miss=False)
+        if result is not None:
+            stream(result)
+            return result
+        system, instructions = build_section_request(pitch_deck_text, prompt_template, context_template)
+        result = call_claude_api(instructions, max_tokens, model, system, stream, temperature=temperature,
+                                 section=section)
+        if result:
+            result_cache_put(key, result)
+    finally:
+        # Stored in the result cache before leaving the table: a request that misses the cache
+        # afterwards either joins this call or finds the result in its second cache check
+        with _in_flight_lock:
+            del IN_FLIGHT_CALLS[key]
+        call.finish(result)
+    return result
+
+# Largest upload we will parse, and how many uploads may be parsed at the same time.
+# Together they bound the memory extraction can take when many sessions upload at once.
+MAX_UPLOAD_BYTES = int(os.environ.get("PITCHME_MAX_UPLOAD_MB", "50")) * 1024 * 1024
+@st.cache_resource(show_spinner=False)
+def _shared_extraction_slots():
+    return threading.BoundedSemaphore(int(os.environ.get("PITCHME_EXTRACTION_SLOTS", "4")))
+
+_extraction_slots = _shared_extraction_slots()
+
+# Peak resident memory of this process in bytes (ru_maxrss is KB on Linux, bytes on macOS)
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# Open an upload as an in-memory stream. BytesIO shares the upload's buffer
+# until written to, so parsing needs neither a temp file nor a second copy.
+def _upload_stream(uploaded_file):
+    return BytesIO(uploaded_file.getvalue())
+
+# One slide (PDF page, PowerPoint slide or Word section) of an extracted deck
+class Slide:
+    __slots__ = ("index", "title", "body", "notes", "shape_count", "char_count")
+
+    def __init__(self, index, title, body, notes="", shape_count=0):
+        self.index = index
+        self.title = title
+        self.body = body
+        self.notes = notes
+        self.shape_count = shape_count
+        self.char_count = len(body)
+
+    def __repr__(self):
+        return f"Slide(index={self.index}, title={self.title!r}, char_count={self.char_count})"
+
+# First non-empty line of a block of text, used as the title of PDF pages
+def _first_line(text):
+    for line in text.splitlines():
+        if line.strip():
+            return line.strip()
+    return ""
+
+# Yield the slides of an uploaded deck as they are parsed, stopping after max_slides
+def iter_slides_from_file(uploaded_file, max_slides=None):
     file_extension = uploaded_file.name.split('.')[-1].lower()
-    if file_extension == 'pdf':
-        return extract_text_from_pdf(uploaded_file)
-    elif file_extension in ['ppt', 'pptx']:
-        return extract_text_from_pptx(uploaded_file)
-    elif file_extension in ['doc', 'docx']:
-        return extract_text_from_docx(uploaded_file)
-    else:
+    if file_extension not in ['pdf', 'ppt', 'pptx', 'doc', 'docx']:
         st.error(f"Unsupported file format: .{file_extension}")
+        return
+    if len(uploaded_file.getvalue()) > MAX_UPLOAD_BYTES:
+        st.error(f"File is too large to analyze (limit is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB).")
+        return
+    with _extraction_slots:
+        if file_extension == 'pdf':
+            yield from iter_pdf_slides(uploaded_file, max_slides)
+        elif file_extension in ['ppt', 'pptx']:
+            yield from iter_pptx_slides(uploaded_file, max_slides)
+        else:
+            yield from iter_docx_slides(uploaded_file, max_slides)
+
+# Parse an uploaded deck into slides, or None for an unsupported file format
+def extract_slides_from_file(uploaded_file, max_slides=None):
+    file_extension = uploaded_file.name.split('.')[-1].lower()
+    with trace_span("extract", file_type=file_extension, bytes=getattr(uploaded_file, "size", None)) as span:
+        if file_extension not in ['pdf', 'ppt', 'pptx', 'doc', 'docx']:
+            span["status"] = "error"
+            st.error(f"Unsupported file format: .{file_extension}")
+            return None
+        slides = list(iter_slides_from_file(uploaded_file, max_slides))
+        span["slides"] = len(slides)
+        span["chars"] = sum(slide.char_count for slide in slides)
+        return slides
+
+# Join slides into the text layout the prompts use for their file format
+def slides_to_text(slides, file_extension):
+    if file_extension == 'pdf':
+        return pdf_slides_to_text(slides)
+    if file_extension in ['ppt', 'pptx']:
+        return pptx_slides_to_text(slides)
+    return docx_slides_to_text(slides)
+
+# Extract text from various file formats
+def extract_text_from_file(uploaded_file, max_slides=None):
+    slides = extract_slides_from_file(uploaded_file, max_slides)
+    if slides is None:
         return None
+    return slides_to_text(slides, uploaded_file.name.split('.')[-1].lower())
+
+# Decks with at least this many uncached pages are extracted on a process pool
+PARALLEL_PDF_MIN_PAGES = int(os.environ.get("PITCHME_PARALLEL_PDF_MIN_PAGES", "40"))
+PDF_EXTRACTION_WORKERS = int(os.environ.get("PITCHME_PDF_WORKERS", str(os.cpu_count() or 1)))
+# Pages are parsed and yielded in batches of this size so large decks still stream
+PDF_BATCH_PAGES = 2 * PARALLEL_PDF_MIN_PAGES
+# Text of recently seen PDF pages keyed by content and font hash, shared by all sessions in this process
+PAGE_TEXT_CACHE_SIZE = int(os.environ.get("PITCHME_PAGE_CACHE_SIZE", "20000"))
+
+@st.cache_resource(show_spinner=False)
+def _shared_page_text_cache():
+    return OrderedDict(), threading.Lock()
+
+_page_text_cache, _page_text_cache_lock = _shared_page_text_cache()
+
+# Process pool shared by all PDF extractions, created on first use. Workers are spawned rather
+# than forked, since forking the multi-threaded server can copy locks held by other threads.
+@st.cache_resource(show_spinner=False)
+def _get_pdf_process_pool():
+    return ProcessPoolExecutor(max_workers=PDF_EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+# Extract the given pages, splitting them into one contiguous run per worker for large decks
+def _extract_pdf_pages(pdf_reader, pdf_bytes, page_numbers):
+    if len(page_numbers) < PARALLEL_PDF_MIN_PAGES or PDF_EXTRACTION_WORKERS <= 1:
+        return [pdf_reader.pages[i].extract_text() or "" for i in page_numbers]
+    chunk_size = -(-len(page_numbers) // PDF_EXTRACTION_WORKERS)
+    chunks = [page_numbers[i:i + chunk_size] for i in range(0, len(page_numbers), chunk_size)]
+    import pdf_pages
+    pool = _get_pdf_process_pool()
+    texts = []
+    for chunk_texts in pool.map(pdf_pages.extract_pages, [pdf_bytes] * len(chunks), chunks):
+        texts.extend(chunk_texts)
+    return texts
+
+# Text of the given pages, parsing only pages whose content has not been seen before
+def _pdf_page_texts(pdf_reader, pdf_bytes, page_numbers):
+    import pdf_pages
+    memo = {}
+    page_hashes = [pdf_pages.page_content_hash(pdf_reader.pages[i], memo) for i in page_numbers]
+    with _page_text_cache_lock:
+        page_texts = [_page_text_cache.get(page_hash) for page_hash in page_hashes]
+    # A revised deck only re-reads the pages that changed
+    missing = [n for n, text in enumerate(page_texts) if text is None]
+    if missing:
+        extracted = _extract_pdf_pages(pdf_reader, pdf_bytes, [page_numbers[n] for n in missing])
+        for n, text in zip(missing, extracted):
+            page_texts[n] = text
+    with _page_text_cache_lock:
+        for page_hash, text in zip(page_hashes, page_texts):
+            _page_text_cache[page_hash] = text
+            _page_text_cache.move_to_end(page_hash)
+        while len(_page_text_cache) > PAGE_TEXT_CACHE_SIZE:
+            _page_text_cache.popitem(last=False)
+    return page_texts
+
+# Yield the pages of a PDF as slides
+def iter_pdf_slides(pdf_file, max_slides=None):
+    from PyPDF2 import PdfReader
+    with _upload_stream(pdf_file) as stream:
+        pdf_reader = PdfReader(stream)
+        page_count = len(pdf_reader.pages)
+        if max_slides is not None:
+            page_count = min(page_count, max_slides)
+        for start in range(0, page_count, PDF_BATCH_PAGES):
+            page_numbers = list(range(start, min(start + PDF_BATCH_PAGES, page_count)))
+            for i, text in zip(page_numbers, _pdf_page_texts(pdf_reader, pdf_file.getvalue(), page_numbers)):
+                yield Slide(i, _first_line(text), text)
+
+# Join PDF slides into the text layout used by the prompts
+def pdf_slides_to_text(slides):
+    return "".join(slide.body + "\n\n" for slide in slides)
 
 # Extract text from PDF
-def extract_text_from_pdf(pdf_file):
-    temp_dir = tempfile.TemporaryDirectory()
-    temp_path = Path(temp_dir.name) / "pitch_deck.pdf"
-    with open(temp_path, "wb") as f:
-        f.write(pdf_file.getvalue())
-    pdf_reader = PdfReader(temp_path)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n\n"
-    temp_dir.cleanup()
-    return text
+def extract_text_from_pdf(pdf_file, max_slides=None):
+    return pdf_slides_to_text(iter_pdf_slides(pdf_file, max_slides))
 
-# Extract text from PowerPoint
-def extract_text_from_pptx(pptx_file):
+# Yield the slides of a PowerPoint deck
+def iter_pptx_slides(pptx_file, max_slides=None):
     try:
         import pptx
-        temp_dir = tempfile.TemporaryDirectory()
-        temp_path = Path(temp_dir.name) / "pitch_deck.pptx"
-        with open(temp_path, "wb") as f:
-            f.write(pptx_file.getvalue())
-        presentation = pptx.Presentation(temp_path)
-        text = ""
-        for slide in presentation.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text += shape.text + "\n"
-            text += "\n\n"
-        temp_dir.cleanup()
-        return text
     except ImportError:
         st.error("PowerPoint processing library not available. Please install python-pptx.")
-        return None
+        return
+    with _upload_stream(pptx_file) as stream:
+        presentation = pptx.Presentation(stream)
+        for i, slide in enumerate(presentation.slides):
+            if max_slides is not None and i >= max_slides:
+                break
+            texts = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+            title_shape = slide.shapes.title
+            title = title_shape.text.strip() if title_shape is not None else _first_line("\n".join(texts))
+            notes = slide.notes_slide.notes_text_frame.text if slide.has_notes_slide else ""
+            yield Slide(i, title, "\n".join(texts), notes, len(slide.shapes))
+
+# Join PowerPoint slides into the text layout used by the prompts
+def pptx_slides_to_text(slides):
+    return "".join((slide.body + "\n" if slide.body else "") + "\n\n" for slide in slides)
 
-# Extract text from Word document
-def extract_text_from_docx(docx_file):
+# Extract text from PowerPoint
+def extract_text_from_pptx(pptx_file, max_slides=None):
+    return pptx_slides_to_text(iter_pptx_slides(pptx_file, max_slides))
+
+# Yield a Word document as slides, starting a new one at every heading
+def iter_docx_slides(docx_file, max_slides=None):
     try:
         import docx
-        temp_dir = tempfile.TemporaryDirectory()
-        temp_path = Path(temp_dir.name) / "pitch_deck.docx"
-        with open(temp_path, "wb") as f:
-            f.write(docx_file.getvalue())
-        doc = docx.Document(temp_path)
-        text = ""
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        temp_dir.cleanup()
-        return text
     except ImportError:
         st.error("Word processing library not available. Please install python-docx.")
-        return None
+        return
+    with _upload_stream(docx_file) as stream:
+        doc = docx.Document(stream)
+        index = 0
+        title = ""
+        paragraphs = []
+        for para in doc.paragraphs:
+            if para.style is not None and para.style.name.startswith("Heading") and paragraphs:
+                yield Slide(index, title, "\n".join(paragraphs), shape_count=len(paragraphs))
+                index += 1
+                if max_slides is not None and index >= max_slides:
+                    return
+                paragraphs = []
+            if not paragraphs:
+                title = para.text.strip()
+            paragraphs.append(para.text)
+        if paragraphs:
+            yield Slide(index, title, "\n".join(paragraphs), shape_count=len(paragraphs))
+
+# Join Word sections into the text layout used by the prompts
+def docx_slides_to_text(slides):
+    return "".join(slide.body + "\n" for slide in slides)
+
+# Extract text from Word document
+def extract_text_from_docx(docx_file, max_slides=None):
+    return docx_slides_to_text(iter_docx_slides(docx_file, max_slides))
+
+# Optional cap on deck size in tokens after compaction (0 means no limit)
+DECK_TOKEN_BUDGET = int(os.environ.get("PITCHME_DECK_TOKEN_BUDGET", "0"))
+# Measure tokens with the API's token counter instead of the local estimate
+COUNT_TOKENS_WITH_API = os.environ.get("PITCHME_COUNT_TOKENS_WITH_API", "0") == "1"
+# Rough characters per token for English prose, used by the local estimate
+CHARS_PER_TOKEN = 4
+# A line found on at least this share of slides (and at least 3) is treated as a repeated footer or header
+REPEATED_LINE_SHARE = 0.4
+
+_PAGE_NUMBER_LINE = re.compile(r"^(?:page|slide)?\s*(\d{1,3})(?:\s*(?:/|of)\s*\d{1,3})?$", re.IGNORECASE)
+# Lines that are nothing but a confidentiality banner or a copyright notice ("Confidential",
+# "Private & Confidential - do not distribute", "© 2024 Acme Inc."), dropped even on a single
+# slide. A sentence that merely starts with one of these words is content and is kept.
+_BOILERPLATE_LINE = re.compile(
+    r"^((strictly\s+)?(private\s+(and|&)\s+)?confidential"
+    r"(\s*[-–—:|]?\s*(do not (distribute|share|copy)|not for (distribution|circulation)))?\.?"
+    r"|(©|\(c\)|copyright)\s*(©\s*)?\d{4}\b.*)$",
+    re.IGNORECASE
+)
+
+# Estimate or count the number of input tokens in a piece of text
+def count_tokens(text, use_api=None):
+    if use_api is None:
+        use_api = COUNT_TOKENS_WITH_API
+    if use_api and hasattr(client, 'messages') and hasattr(client.messages, 'count_tokens'):
+        try:
+            return client.messages.count_tokens(
+                model=CLAUDE_MODEL,
+                messages=[{"role": "user", "content": text}]
+            ).input_tokens
+        except Exception:
+            pass
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+# Key used to recognise the same footer on different slides, ignoring case and a trailing page number
+def _line_signature(line):
+    return re.sub(r"[\s|/·•-]*\d{1,3}$", "", line.lower())
+
+# Difference between the page numbers printed on the slides and the slides' positions, when
+# a number line follows the slide sequence on enough slides to be page numbering, else None
+def _page_number_offset(blocks, threshold):
+    offsets = Counter()
+    for position, lines in enumerate(blocks):
+        numbers = {int(match.group(1)) for match in map(_PAGE_NUMBER_LINE.match, lines) if match}
+        offsets.update({number - position for number in numbers})
+    offset, count = max(offsets.items(), key=lambda item: item[1], default=(None, 0))
+    return offset if count >= threshold else None
+
+# Remove repeated footers, slide numbers, banners and extra whitespace from the deck text,
+# optionally truncating it to token_budget. Returns the compacted text and before/after counts.
+# Pass the deck's `slides` to compact slide by slide; otherwise blank lines separate the slides.
+def compact_deck_text(pitch_deck_text, token_budget=None, slides=None):
+    if token_budget is None:
+        token_budget = DECK_TOKEN_BUDGET
+    if slides is None:
+        slide_texts = re.split(r"\n\s*\n", pitch_deck_text)
+    else:
+        slide_texts = [slide.body for slide in slides]
+    blocks = [
+        [" ".join(line.split()) for line in block.splitlines() if line.strip()]
+        for block in slide_texts
+    ]
+    blocks = [lines for lines in blocks if lines]
+
+    # Lines that show up on many slides are headers, footers or banners. A bare number is
+    # only page numbering when it follows the slide sequence; otherwise it is a figure.
+    slides_per_line = Counter()
+    for lines in blocks:
+        slides_per_line.update({_line_signature(line) for line in lines})
+    repeat_threshold = max(3, REPEATED_LINE_SHARE * len(blocks))
+    repeated = {signature for signature, count in slides_per_line.items() if signature and count >= repeat_threshold}
+    page_offset = _page_number_offset(blocks, repeat_threshold)
+
+    kept_blocks = []
+    seen_repeated = set()
+    lines_removed = 0
+    for position, lines in enumerate(blocks):
+        kept = []
+        for line in lines:
+            signature = _line_signature(line)
+            page_number = _PAGE_NUMBER_LINE.match(line)
+            drop = (
+                (page_number and page_offset is not None and int(page_number.group(1)) - position == page_offset)
+                or (_BOILERPLATE_LINE.match(line) and len(line) < 120)
+                or (kept and kept[-1] == line)
+                or signature in seen_repeated
+            )
+            if drop:
+                lines_removed += 1
+                continue
+            # Keep the first copy of a repeated line so e.g. the company name survives once
+            if signature in repeated:
+                seen_repeated.add(signature)
+            kept.append(line)
+        if kept:
+            kept_blocks.append("\n".join(kept))
+
+    compacted = "\n\n".join(kept_blocks)
+    truncated = bool(token_budget) and count_tokens(compacted) > token_budget
+    if truncated:
+        notice = "\n\n[Remaining slides omitted to fit the analysis budget]"
+        compacted = compacted[:max(0, token_budget * CHARS_PER_TOKEN - len(notice))].rsplit("\n", 1)[0] + notice
+
+    stats = {
+        "chars_before": len(pitch_deck_text),
+        "chars_after": len(compacted),
+        "tokens_before": count_tokens(pitch_deck_text),
+        "tokens_after": count_tokens(compacted),
+        "lines_removed": lines_removed,
+        "truncated": truncated,
+    }
+    return compacted, stats
+
+# Paragraph styles for the PDF report, built once per process
+@st.cache_resource(show_spinner=False)
+def _report_styles():
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    styles = getSampleStyleSheet()
+
+    # Add custom style for headers
+    styles.add(ParagraphStyle(
+        name='CustomHeading1',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=12
+    ))
+    return styles
+
+# Build the flowables for one report section. They are made fresh for every report:
+# reportlab splits flowables while laying out a page, so they can't be reused in another build.
+def _report_section_flowables(section, section_content):
+    from reportlab.platypus import Paragraph, Spacer
+    styles = _report_styles()
+    flowables = []
+    # Format section title
+    formatted_title = " ".join(word.capitalize() for word in section.replace("_", " ").split())
+    flowables.append(Paragraph(formatted_title, styles['Heading2']))
+    flowables.append(Spacer(1, 6))
+
+    # Add plain text content - simple but reliable
+    paragraphs = section_content.split('\n\n')
+    for para in paragraphs:
+        if para.strip():
+            flowables.append(Paragraph(para.replace("<", "&lt;").replace(">", "&gt;"), styles['Normal']))
+            flowables.append(Spacer(1, 6))
+
+    flowables.append(Spacer(1, 12))
+    return flowables
 
 # Function to export evaluation results as a PDF
 def export_results_to_pdf(results):
+    with trace_span("export_pdf", sections=len(results)) as span:
+        pdf = _build_pdf_report(results)
+        span["bytes"] = len(pdf)
+        return pdf
+
+def _build_pdf_report(results):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
     try:
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        
-        # Add custom style for headers
-        styles.add(ParagraphStyle(
-            name='CustomHeading1',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=12
-        ))
-        
+        styles = _report_styles()
+
         content = []
-        
+
         # Add title
         content.append(Paragraph("PitchMe Analysis Report", styles['CustomHeading1']))
         content.append(Spacer(1, 12))
-        
+
         # Add each section
         for section, section_content in results.items():
-            # Format section title
-            formatted_title = " ".join(word.capitalize() for word in section.replace("_", " ").split())
-            content.append(Paragraph(formatted_title, styles['Heading2']))
-            content.append(Spacer(1, 6))
-            
-            # Add plain text content - simple but reliable
-            paragraphs = section_content.split('\n\n')
-            for para in paragraphs:
-                if para.strip():
-                    content.append(Paragraph(para.replace("<", "&lt;").replace(">", "&gt;"), styles['Normal']))
-                    content.append(Spacer(1, 6))
-            
-            content.append(Spacer(1, 12))
-        
+            content.extend(_report_section_flowables(section, section_content))
+
         # Build the PDF
         doc.build(content)
         buffer.seek(0)
@@ -677,170 +1975,1012 @@ def export_results_to_pdf(results):
         # Return a simple error message as PDF
         return b"Could not generate PDF report. See error in application."
 
-# Function to evaluate the pitch deck
-def evaluate_pitch_deck(pitch_deck_text, analyze_design=False):
-    results = {}
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    # Determine how many analyses we'll run
-    total_analyses = 6  # Base analyses including business model and expert panel
-    if analyze_design:
-        total_analyses += 1
-    progress_step = 100 / total_analyses
-    current_progress = 0
-
-    # Story Analysis
-    status_text.text("Analyzing story elements...")
-    story_prompt = STORY_PROMPT.format(pitch_deck_text=pitch_deck_text)
-    story_analysis = call_claude_api(story_prompt)
-    if story_analysis:
-        results["story"] = story_analysis
-        current_progress += progress_step
-        progress_bar.progress(int(current_progress))
-    else:
-        st.error("Failed to analyze story elements.")
-        return None
-
-    # Startup Stage
-    status_text.text("Identifying startup stage...")
-    stage_prompt = STARTUP_STAGE_PROMPT.format(pitch_deck_text=pitch_deck_text)
-    stage_analysis = call_claude_api(stage_prompt)
-    if stage_analysis:
-        results["startup_stage"] = stage_analysis
-        current_progress += progress_step
-        progress_bar.progress(int(current_progress))
-    else:
-        st.error("Failed to identify startup stage.")
-        return None
-
-    # Market Entry
-    status_text.text("Evaluating market entry strategy...")
-    market_prompt = MARKET_ENTRY_PROMPT.format(pitch_deck_text=pitch_deck_text)
-    market_analysis = call_claude_api(market_prompt)
-    if market_analysis:
-        results["market_entry"] = market_analysis
-        current_progress += progress_step
-        progress_bar.progress(int(current_progress))
-    else:
-        st.error("Failed to evaluate market entry strategy.")
-        return None
-
-    # Business Model
-    status_text.text("Analyzing business model...")
-    business_prompt = BUSINESS_MODEL_PROMPT.format(pitch_deck_text=pitch_deck_text)
-    business_analysis = call_claude_api(business_prompt, max_tokens=6000)
-    if business_analysis:
-        results["business_model"] = business_analysis
-        current_progress += progress_step
-        progress_bar.progress(int(current_progress))
-    else:
-        st.error("Failed to analyze business model.")
-        return None
+# Finished PDF reports, keyed by a hash of the results they were built from
+REPORT_CACHE_SIZE = 64
+
+# Single background worker for report building, so reports don't compete with the page for CPU
+@st.cache_resource(show_spinner=False)
+def _report_worker():
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="pitchme-report"), OrderedDict(), threading.Lock()
+
+# Hash identifying a results dict, including its section order
+def results_hash(results):
+    return hashlib.sha256(json.dumps(list(results.items())).encode("utf-8")).hexdigest()
+
+# Start (or reuse) a background build of the PDF report; returns a future for its bytes
+def submit_pdf_report(results):
+    executor, reports, lock = _report_worker()
+    key = results_hash(results)
+    with lock:
+        if key not in reports:
+            reports[key] = executor.submit(export_results_to_pdf, dict(results))
+            while len(reports) > REPORT_CACHE_SIZE:
+                reports.popitem(last=False)
+        reports.move_to_end(key)
+        return reports[key]
+
+# Routing table: model, output budget, temperature and optional fallback model per section.
+# Any field can be overridden with PITCHME_SECTION_ROUTES, a JSON object keyed by section, e.g.
+#   PITCHME_SECTION_ROUTES='{"story": {"model": "claude-3-haiku-20240307", "max_tokens": 2500}}'
+# A temperature of None leaves the API default. The fallback model is tried when the main one fails.
+SECTION_ROUTES = {
+    "story": {"model": CLAUDE_MODEL, "max_tokens": 4000, "temperature": None, "fallback_model": None},
+    "startup_stage": {"model": CLAUDE_FAST_MODEL, "max_tokens": 4000, "temperature": 0.0, "fallback_model": CLAUDE_MODEL},
+    "market_entry": {"model": CLAUDE_MODEL, "max_tokens": 4000, "temperature": None, "fallback_model": None},
+    "business_model": {"model": CLAUDE_MODEL, "max_tokens": 6000, "temperature": None, "fallback_model": None},
+    "expert_panel": {"model": CLAUDE_MODEL, "max_tokens": 6000, "temperature": None, "fallback_model": None},
+    "design": {"model": CLAUDE_MODEL, "max_tokens": 4000, "temperature": None, "fallback_model": None},
+    "overall_feedback": {"model": CLAUDE_MODEL, "max_tokens": 4000, "temperature": None, "fallback_model": None},
+}
+
+# Apply the PITCHME_SECTION_ROUTES overrides to the routing table
+def _load_section_routes():
+    overrides = os.environ.get("PITCHME_SECTION_ROUTES")
+    if not overrides:
+        return
+    try:
+        overrides = json.loads(overrides)
+    except json.JSONDecodeError as e:
+        logging.getLogger(__name__).warning("Ignoring PITCHME_SECTION_ROUTES: %s", e)
+        return
+    for key, route in overrides.items():
+        if key not in SECTION_ROUTES or not isinstance(route, dict):
+            logging.getLogger(__name__).warning("Ignoring PITCHME_SECTION_ROUTES entry %r", key)
+            continue
+        SECTION_ROUTES[key].update(
+            {field: value for field, value in route.items() if field in SECTION_ROUTES[key]}
+        )
+
+_load_section_routes()
+
+# Sections analyzed for every pitch deck, in the order the results are displayed
+EVALUATION_SECTIONS = [
+    {
+        "key": "story",
+        "label": "📖 Story Analysis",
+        "prompt": STORY_PROMPT,
+        "retries": 1,
+        "error": "Failed to analyze story elements."
+    },
+    {
+        "key": "startup_stage",
+        "label": "🚀 Startup Stage",
+        "prompt": STARTUP_STAGE_PROMPT,
+        "retries": 1,
+        "error": "Failed to identify startup stage."
+    },
+    {
+        "key": "market_entry",
+        "label": "🎯 Market Entry",
+        "prompt": MARKET_ENTRY_PROMPT,
+        "retries": 1,
+        "error": "Failed to evaluate market entry strategy."
+    },
+    {
+        "key": "business_model",
+        "label": "💼 Business Model",
+        "prompt": BUSINESS_MODEL_PROMPT,
+        "retries": 1,
+        "error": "Failed to analyze business model."
+    },
+    {
+        "key": "expert_panel",
+        "label": "👥 Expert Panel",
+        "prompt": EXPERT_PANEL_PROMPT,
+        "retries": 1,
+        "error": "Failed to gather expert panel feedback."
+    },
+    {
+        "key": "design",
+        "label": "🎨 Design Analysis",
+        "prompt": DESIGN_ANALYSIS_PROMPT,
+        "retries": 1,
+        "error": "Failed to analyze design elements."
+    },
+    {
+        "key": "overall_feedback",
+        "label": "📝 Overall Feedback",
+        "prompt": OVERALL_FEEDBACK_PROMPT,
+        "retries": 1,
+        "error": "Failed to generate overall feedback."
+    },
+]
+
+# Evaluation dependency graph: a section listed here runs after the sections it depends on,
+# over a digest of their results plus the deck excerpts they refer to, instead of the whole deck.
+# Dependencies that are not part of an evaluation (design when it is off) are ignored.
+SECTION_DEPENDENCIES = {
+    "overall_feedback": ["story", "startup_stage", "market_entry", "business_model", "expert_panel", "design"],
+}
+# Size of each analysis in the digest, and of the deck excerpts sent along with it
+SYNTHESIS_DIGEST_CHARS = 2400
+SYNTHESIS_EXCERPT_TOKENS = int(os.environ.get("PITCHME_SYNTHESIS_EXCERPT_TOKENS", "2000"))
+
+_DIGEST_LINE = re.compile(r"^\s*(#|[-*+] |\d+[.)] |\*\*)")
+_EXCERPT_WORD = re.compile(r"[a-z][a-z0-9'-]{3,}|\d[\d.,%$€£]*")
+
+# Condense one analysis for the digest: keep headings, bullets and bold lead-ins,
+# drop diagrams and tables, and cut it at a line boundary after max_chars
+def digest_section(content, max_chars=None):
+    if max_chars is None:
+        max_chars = SYNTHESIS_DIGEST_CHARS
+    content = re.sub(r"```.*?(```|$)", "", content, flags=re.DOTALL)
+    lines = [line.rstrip() for line in content.splitlines() if _DIGEST_LINE.match(line)]
+    digest = []
+    size = 0
+    for line in lines:
+        if size + len(line) > max_chars:
+            break
+        digest.append(line)
+        size += len(line) + 1
+    return "\n".join(digest)
+
+# Pick the deck blocks (slides) that share the most words and figures with the digest, within
+# SYNTHESIS_EXCERPT_TOKENS and in deck order. The first block, usually the title slide, is always kept.
+def relevant_deck_excerpts(pitch_deck_text, digest, token_budget=None):
+    if token_budget is None:
+        token_budget = SYNTHESIS_EXCERPT_TOKENS
+    blocks = [block.strip() for block in re.split(r"\n\s*\n", pitch_deck_text) if block.strip()]
+    if not blocks:
+        return ""
+    char_budget = token_budget * CHARS_PER_TOKEN
+    if sum(len(block) + 2 for block in blocks) <= char_budget:
+        return "\n\n".join(blocks)
+    digest_words = Counter(_EXCERPT_WORD.findall(digest.lower()))
+    scores = {
+        i: sum(digest_words[word] for word in set(_EXCERPT_WORD.findall(block.lower()))) / (1 + len(block) ** 0.5)
+        for i, block in enumerate(blocks)
+    }
+    chosen = {0}
+    size = len(blocks[0][:char_budget])
+    for i in sorted(scores, key=scores.get, reverse=True):
+        if i not in chosen and size + len(blocks[i]) + 2 <= char_budget:
+            chosen.add(i)
+            size += len(blocks[i]) + 2
+    return "\n\n".join(blocks[i][:char_budget] for i in sorted(chosen))
+
+# Input of a dependent section: a digest of the analyses it depends on plus the relevant deck excerpts.
+# Returns None when one of those analyses is missing, in which case the section reads the whole deck.
+def build_synthesis_input(pitch_deck_text, section_key, results, active_keys):
+    labels = {s["key"]: s["label"] for s in EVALUATION_SECTIONS}
+    parts = []
+    for key in SECTION_DEPENDENCIES[section_key]:
+        if key not in active_keys:
+            continue
+        if key not in results:
+            return None
+        parts.append(f"## {labels[key]}\n{digest_section(results[key])}")
+    digest = "\n\n".join(parts)
+    return f"{digest}\n\n# Deck Excerpts\n{relevant_deck_excerpts(pitch_deck_text, digest)}"
+
+# Maximum number of section analyses sent to Claude at the same time (1 runs them one after another)
+MAX_CONCURRENT_SECTIONS = int(os.environ.get("PITCHME_MAX_CONCURRENT_SECTIONS", "4"))
+
+# Minimum interval between job store writes of a streaming section
+STREAM_SAVE_SECONDS = 1.0
+
+# Thread pool whose workers bill their calls to the same ledger context as the caller
+def _thread_pool(max_workers):
+    usage_context = _usage_context.get()
+    return ThreadPoolExecutor(max_workers=max_workers, initializer=_usage_context.set, initargs=(usage_context,))
+
+# Wrap a streamed-text callback so it runs at most once every `interval` seconds
+def _throttled(callback, interval):
+    last_call = [0.0]
+    def write(text):
+        now = time.monotonic()
+        if now - last_call[0] >= interval:
+            last_call[0] = now
+            callback(text)
+    return write
+
+# Decks estimated above this many tokens are summarized in chunks before the section analyses run
+MAP_REDUCE_THRESHOLD_TOKENS = int(os.environ.get("PITCHME_MAP_REDUCE_THRESHOLD_TOKENS", "100000"))
+# Target size of each chunk in the map step, and the length of each chunk summary
+MAP_CHUNK_TOKENS = int(os.environ.get("PITCHME_MAP_CHUNK_TOKENS", "20000"))
+MAP_SUMMARY_MAX_TOKENS = 3000
+
+# Group the slides of a deck into chunks of at most chunk_tokens estimated tokens
+def chunk_deck_text(pitch_deck_text, chunk_tokens=None):
+    if chunk_tokens is None:
+        chunk_tokens = MAP_CHUNK_TOKENS
+    chunk_chars = chunk_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    current_size = 0
+    for block in re.split(r"\n\s*\n", pitch_deck_text):
+        block = block.strip()
+        if not block:
+            continue
+        # A single slide larger than a chunk is split on its own
+        pieces = [block[i:i + chunk_chars] for i in range(0, len(block), chunk_chars)]
+        for piece in pieces:
+            if current and current_size + len(piece) > chunk_chars:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_size = 0
+            current.append(piece)
+            current_size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+# Map step: summarize each chunk of a very large deck in parallel and join the summaries
+# into a condensed deck that the section prompts can read. Returns None if a chunk fails.
+def condense_large_deck(pitch_deck_text, max_concurrency=None):
+    if max_concurrency is None:
+        max_concurrency = MAX_CONCURRENT_SECTIONS
+    chunks = chunk_deck_text(pitch_deck_text)
+    summaries = [None] * len(chunks)
+    with _thread_pool(max(1, min(max_concurrency, len(chunks)))) as executor:
+        futures = {
+            executor.submit(cached_claude_api, chunk, CHUNK_SUMMARY_PROMPT, MAP_SUMMARY_MAX_TOKENS): i
+            for i, chunk in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            summary = future.result()
+            if not summary:
+                for pending in futures:
+                    pending.cancel()
+                return None
+            summaries[futures[future]] = summary
+    return "\n\n".join(
+        f"## Part {i} of {len(chunks)}\n{summary.strip()}" for i, summary in enumerate(summaries, 1)
+    )
+
+# Run one section on its routed model, retrying it up to its "retries" count if no analysis
+# comes back, and trying the fallback model after each failure on the main one.
+# (Transient API errors are already retried with backoff inside call_claude_api.)
+# If every attempt fails, the last API error is raised so its text reaches the job.
+def _run_section(pitch_deck_text, section, on_text=None, context_template=None):
+    route = SECTION_ROUTES[section["key"]]
+    models = [route["model"]] + ([route["fallback_model"]] if route["fallback_model"] else [])
+    error = None
+    for attempt in range(section["retries"] + 1):
+        for model in models:
+            try:
+                analysis = cached_claude_api(
+                    pitch_deck_text, section["prompt"], route["max_tokens"], model,
+                    on_text=on_text, temperature=route["temperature"], section=section["key"],
+                    context_template=context_template
+                )
+            except ClaudeAPIError as e:
+                error = e
+                continue
+            if analysis:
+                return analysis
+    if error is not None:
+        raise error
+    return None
+
+# Run a section, waiting first until `event` is set (or `timeout` seconds at the latest) when
+# one is given. Returns the analysis, and the budget refusal or API error that stopped it.
+def _run_section_after(event, timeout, *args):
+    if event is not None:
+        event.wait(timeout)
+    try:
+        return _run_section(*args), None
+    except (BudgetExceeded, ClaudeAPIError) as e:
+        return None, e
+
+# Sections of an evaluation that have no result yet (failed or never run)
+def missing_sections(results, analyze_design):
+    return [
+        s["key"] for s in EVALUATION_SECTIONS
+        if (analyze_design or s["key"] != "design") and s["key"] not in (results or {})
+    ]
 
-    # Expert Panel
-    status_text.text("Gathering expert panel feedback...")
-    expert_prompt = EXPERT_PANEL_PROMPT.format(pitch_deck_text=pitch_deck_text)
-    expert_analysis = call_claude_api(expert_prompt, max_tokens=6000)
-    if expert_analysis:
-        results["expert_panel"] = expert_analysis
-        current_progress += progress_step
-        progress_bar.progress(int(current_progress))
-    else:
-        st.error("Failed to gather expert panel feedback.")
+# Budget refusal that running `sections` again would hit, or None. Retries are not offered
+# while even the cheapest of them cannot fit in the daily or session budget.
+def retry_budget_refusal(pitch_deck_text, sections, session=None):
+    if not sections or (not DAILY_BUDGET_USD and not SESSION_BUDGET_USD):
         return None
+    input_tokens = len(pitch_deck_text) // CHARS_PER_TOKEN
+    estimate = min(
+        token_cost(SECTION_ROUTES[key]["model"], input_tokens=input_tokens, output_tokens=SECTION_ROUTES[key]["max_tokens"])
+        for key in sections
+    )
+    today, in_session = _ledger_spend(session)
+    return _budget_refusal(session, today, in_session, estimate)
+
+# Function to evaluate the pitch deck. Sections already in `completed` are not sent again,
+# and a failed section no longer discards the others: the returned dict holds every section
+# that succeeded, and missing_sections() lists the ones to retry. Independent sections run
+# in parallel; sections in SECTION_DEPENDENCIES start once their inputs have finished.
+# Progress is reported through the callbacks (the job store for the app, the manifest for batch.py);
+# on_section_failed(key, error, cause) also gets the BudgetExceeded or ClaudeAPIError behind a failure, or None.
+def evaluate_pitch_deck(pitch_deck_text, analyze_design=False, max_concurrency=None,
+                        on_section_complete=None, on_section_text=None,
+                        completed=None, on_section_failed=None):
+    if max_concurrency is None:
+        max_concurrency = MAX_CONCURRENT_SECTIONS
+    sections = [s for s in EVALUATION_SECTIONS if analyze_design or s["key"] != "design"]
+    results = {key: text for key, text in (completed or {}).items() if key in {s["key"] for s in sections}}
+    pending = [s for s in sections if s["key"] not in results]
+    failed = []
+    logger = logging.getLogger(__name__)
+
+    # Reduce step: decks too large for one prompt are analyzed from their chunk summaries
+    if pending and count_tokens(pitch_deck_text, use_api=False) > MAP_REDUCE_THRESHOLD_TOKENS:
+        pitch_deck_text = condense_large_deck(pitch_deck_text, max_concurrency)
+        if not pitch_deck_text:
+            logger.error("Failed to condense the pitch deck for analysis.")
+            return None
+
+    # Streamed text of each section, passed on at most once every STREAM_SAVE_SECONDS
+    writers = {}
+    if on_section_text:
+        for section in pending:
+            writers[section["key"]] = _throttled(functools.partial(on_section_text, section["key"]), STREAM_SAVE_SECONDS)
+
+    # Record a finished section, checkpointing it through on_section_complete as soon as it lands
+    def finish_section(section, outcome):
+        analysis, cause = outcome
+        if not analysis:
+            failed.append(section["key"])
+            error = f"{section['error']} {cause}" if cause else section["error"]
+            logger.error(error)
+            if on_section_failed:
+                on_section_failed(section["key"], error, cause)
+            return
+        results[section["key"]] = analysis
+        if on_section_complete:
+            on_section_complete(section["key"], analysis)
+
+    # A section is ready once none of the sections it depends on are still pending
+    active_keys = {s["key"] for s in sections}
+    waiting_on = {
+        s["key"]: {key for key in SECTION_DEPENDENCIES.get(s["key"], []) if key in active_keys and key not in results}
+        for s in pending
+    }
+
+    # Arguments for _run_section: dependent sections read the synthesis input when all of their inputs succeeded
+    def section_call(section):
+        if section["key"] in SECTION_DEPENDENCIES:
+            synthesis = build_synthesis_input(pitch_deck_text, section["key"], results, active_keys)
+            if synthesis is not None:
+                return synthesis, section, writers.get(section["key"]), SYNTHESIS_CONTEXT_TEMPLATE
+        return pitch_deck_text, section, writers.get(section["key"])
+
+    # Mark a section as resolved and return the sections it unblocked
+    def resolve(key):
+        unblocked = []
+        for section in pending:
+            if key in waiting_on[section["key"]]:
+                waiting_on[section["key"]].discard(key)
+                if not waiting_on[section["key"]]:
+                    unblocked.append(section)
+        return unblocked
+
+    ready = [s for s in pending if not waiting_on[s["key"]]]
+
+    # Sequential mode keeps the original one-call-at-a-time behaviour
+    if max_concurrency <= 1:
+        while ready:
+            section = ready.pop(0)
+            finish_section(section, _run_section_after(None, None, *section_call(section)))
+            ready.extend(resolve(section["key"]))
+
+    # Concurrent mode: fan out every ready section, report each one as it finishes and start
+    # the sections it unblocks. With prompt caching the first section writes the shared deck
+    # prefix. The cache entry exists as soon as its answer starts streaming, so the sections on
+    # the same model are held only until its first token, then read the prefix from the cache.
+    # Nothing is held for decks too short to cache, or for sections routed to another model.
+    elif pending:
+        with _thread_pool(min(max_concurrency, len(pending))) as executor:
+            first = ready[0]
+            cache_model = SECTION_ROUTES[first["key"]]["model"]
+            held = []
+            if PROMPT_CACHING and count_tokens(pitch_deck_text, use_api=False) >= prompt_cache_min_tokens(cache_model):
+                held = [s for s in ready[1:] if SECTION_ROUTES[s["key"]]["model"] == cache_model]
+            cache_written = threading.Event()
+
+            def first_text(text):
+                cache_written.set()
+                if writers.get(first["key"]):
+                    writers[first["key"]](text)
+
+            def start(section):
+                args = section_call(section)
+                if section is first and held:
+                    return executor.submit(_run_section_after, None, None, args[0], args[1], first_text, *args[3:])
+                if section in held:
+                    return executor.submit(_run_section_after, cache_written, PROMPT_CACHE_HOLD_SECONDS, *args)
+                return executor.submit(_run_section_after, None, None, *args)
+
+            # Held sections are queued last so they don't take workers from the ones that can start now
+            futures = {start(s): s for s in sorted(ready, key=lambda s: s in held)}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    section = futures.pop(future)
+                    if section is first:
+                        cache_written.set()
+                    finish_section(section, future.result())
+                    for unblocked in resolve(section["key"]):
+                        futures[start(unblocked)] = unblocked
+
+    # Keep the keys in display order regardless of which call finished first
+    return {s["key"]: results[s["key"]] for s in sections if s["key"] in results}
+
+# Evaluations run as background jobs so they survive reruns, refreshes and dropped connections.
+# Job progress lives in a SQLite store next to the result cache, where any session can poll it.
+JOB_STORE_PATH = RESULT_CACHE_PATH.parent / "jobs.sqlite3"
+JOB_WORKERS = int(os.environ.get("PITCHME_JOB_WORKERS", "4"))
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+JOB_POLL_SECONDS = 1.0
+# A queued or running job with no progress for this long is treated as lost (e.g. the server restarted)
+JOB_STALE_SECONDS = 15 * 60
+
+# Create the job store and its tables, once per process
+@st.cache_resource(show_spinner=False)
+def _create_job_store():
+    JOB_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(JOB_STORE_PATH, timeout=30)) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, error TEXT, info TEXT NOT NULL, "
+            "deck_text TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL, retryable INTEGER)"
+        )
+        # Added after the table: whether running the job's failed sections again may help
+        if "retryable" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN retryable INTEGER")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_sections ("
+            "job_id TEXT NOT NULL, key TEXT NOT NULL, status TEXT NOT NULL, text TEXT NOT NULL, "
+            "updated REAL NOT NULL, PRIMARY KEY (job_id, key))"
+        )
+    return True
+
+# Open the job store
+def _open_job_store():
+    _create_job_store()
+    return sqlite3.connect(JOB_STORE_PATH, timeout=30)
+
+# Worker pool that runs evaluation jobs, shared by all sessions
+@st.cache_resource(show_spinner=False)
+def _job_executor():
+    return ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="pitchme-job")
+
+# Record a new job and drop jobs older than the retention period
+def create_job(job_id, pitch_deck_text, info):
+    now = time.time()
+    with closing(_open_job_store()) as conn, conn:
+        expired = now - JOB_RETENTION_SECONDS
+        conn.execute("DELETE FROM job_sections WHERE job_id IN (SELECT id FROM jobs WHERE updated < ?)", (expired,))
+        conn.execute("DELETE FROM jobs WHERE updated < ?", (expired,))
+        conn.execute(
+            "INSERT INTO jobs (id, status, error, info, deck_text, created, updated) "
+            "VALUES (?, 'queued', NULL, ?, ?, ?, ?)",
+            (job_id, json.dumps(info), pitch_deck_text, now, now)
+        )
+
+# Update the status of a job
+def update_job(job_id, status, error=None, retryable=False):
+    with closing(_open_job_store()) as conn, conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, retryable = ?, updated = ? WHERE id = ?",
+            (status, error, int(retryable), time.time(), job_id)
+        )
+
+# Save the partial or final text of one section of a job
+def save_job_section(job_id, key, status, text):
+    with closing(_open_job_store()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_sections (job_id, key, status, text, updated) VALUES (?, ?, ?, ?, ?)",
+            (job_id, key, status, text, time.time())
+        )
+
+# Load a job with its sections, or None if there is no such job
+def load_job(job_id):
+    with closing(_open_job_store()) as conn:
+        row = conn.execute(
+            "SELECT status, error, info, deck_text, created, updated, retryable FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        sections = {
+            key: {"status": status, "text": text, "updated": updated}
+            for key, status, text, updated in conn.execute(
+                "SELECT key, status, text, updated FROM job_sections WHERE job_id = ?", (job_id,)
+            )
+        }
+    status, error, info, deck_text, created, updated, retryable = row
+    return {
+        "id": job_id,
+        "status": status,
+        "error": error,
+        "retryable": bool(retryable),
+        "info": json.loads(info),
+        "deck_text": deck_text,
+        "created": created,
+        "updated": updated,
+        "sections": sections,
+    }
+
+# Body of an evaluation job, run on the job worker pool. Its calls are billed to the
+# session that started it, under the job ID as the evaluation.
+def _run_evaluation_job(job_id, pitch_deck_text, analyze_design, completed=None, session=None):
+    with ledger_context(session=session, evaluation=job_id, deck=deck_hash(pitch_deck_text)):
+        _evaluate_job(job_id, pitch_deck_text, analyze_design, completed)
+
+# Evaluate a job's deck. Each finished section is checkpointed in the job store,
+# and sections passed in `completed` are not run again.
+def _evaluate_job(job_id, pitch_deck_text, analyze_design, completed):
+    update_job(job_id, "running")
+    causes = []
+
+    def section_failed(key, error, cause):
+        save_job_section(job_id, key, "failed", error)
+        if cause is not None:
+            causes.append(cause)
 
-    # Design Analysis (optional)
-    if analyze_design:
-        status_text.text("Analyzing design elements...")
-        design_prompt = DESIGN_ANALYSIS_PROMPT.format(pitch_deck_text=pitch_deck_text)
-        design_analysis = call_claude_api(design_prompt)
-        if design_analysis:
-            results["design"] = design_analysis
-            current_progress += progress_step
-            progress_bar.progress(int(current_progress))
-
-    # Overall Feedback
-    status_text.text("Generating overall feedback...")
-    feedback_prompt = OVERALL_FEEDBACK_PROMPT.format(pitch_deck_text=pitch_deck_text)
-    overall_feedback = call_claude_api(feedback_prompt)
-    if overall_feedback:
-        results["overall_feedback"] = overall_feedback
-        current_progress += progress_step
-        progress_bar.progress(100)  # Ensure we reach 100%
-        status_text.text("Analysis complete!")
+    try:
+        results = evaluate_pitch_deck(
+            pitch_deck_text,
+            analyze_design,
+            on_section_complete=lambda key, text: save_job_section(job_id, key, "done", text),
+            on_section_text=lambda key, text: save_job_section(job_id, key, "running", text),
+            completed=completed,
+            on_section_failed=section_failed
+        )
+    except (BudgetExceeded, ClaudeAPIError) as e:
+        # Raised while condensing a large deck, before any section ran
+        update_job(job_id, "failed", str(e), getattr(e, "retryable", True))
+        return
+    except Exception as e:
+        update_job(job_id, "failed", f"Evaluation stopped unexpectedly: {str(e)}")
+        return
+    if results is None:
+        update_job(job_id, "failed", "The pitch deck could not be prepared for analysis. Please try again.", True)
+        return
+    missing = missing_sections(results, analyze_design)
+    if missing:
+        # The job error says why: a budget refusal first, else the first API error
+        refusals = [c for c in causes if isinstance(c, BudgetExceeded)]
+        cause = (refusals or causes or [None])[0]
+        if results:
+            error = f"{len(missing)} of the analyses failed. The completed ones were kept."
+        else:
+            error = "None of the analyses could be completed."
+        # A retry may help with empty answers, overloads, connection errors and budget refusals
+        # (once there is room again), not when every failure was an error like a rejected key
+        retryable = len(causes) < len(missing) or any(getattr(c, "retryable", True) for c in causes)
+        update_job(job_id, "partial" if results else "failed", f"{error} {cause}" if cause else error, retryable)
     else:
-        st.error("Failed to generate overall feedback.")
+        # The report is built once, from the finished results, rather than section by section as
+        # they complete: reportlab splits flowables in place, so nothing from a build of the first
+        # sections can be reused for the full report, and a full build takes under 100 ms on the
+        # report worker. It is queued before the job is marked done, so it is usually ready first.
+        submit_pdf_report(results)
+        update_job(job_id, "done")
+        if SIMILAR_DECKS:
+            index_evaluation(job_id, pitch_deck_text, _usage_context.get().get("session"))
+
+# Run a job's failed sections again, keeping the ones that already finished
+def retry_evaluation_job(job_id):
+    job = load_job(job_id)
+    if job is None:
+        return False
+    update_job(job_id, "queued")
+    _job_executor().submit(
+        _run_evaluation_job, job_id, job["deck_text"], job["info"]["analyze_design"], job_results(job),
+        job["info"].get("session")
+    )
+    return True
+
+# Queue an evaluation and return its job ID. Sections in `completed` (reused from an earlier
+# evaluation) are saved as done and not run again.
+def submit_evaluation_job(pitch_deck_text, analyze_design, info=None, completed=None):
+    job_id = uuid.uuid4().hex[:12]
+    info = dict(info or {})
+    info["sections"] = [s["key"] for s in EVALUATION_SECTIONS if analyze_design or s["key"] != "design"]
+    info["analyze_design"] = analyze_design
+    create_job(job_id, pitch_deck_text, info)
+    for key, text in (completed or {}).items():
+        save_job_section(job_id, key, "done", text)
+    _job_executor().submit(
+        _run_evaluation_job, job_id, pitch_deck_text, analyze_design, completed, info.get("session")
+    )
+    return job_id
+
+# Results of a job's finished sections, in display order
+def job_results(job):
+    return {
+        key: job["sections"][key]["text"]
+        for key in job["info"]["sections"]
+        if job["sections"].get(key, {}).get("status") == "done"
+    }
+
+# Near-duplicate decks (a typo fix, a new slide) miss the exact-text result cache. A MinHash
+# signature of every finished evaluation's deck is kept in an LSH table on disk, so a revised
+# deck can reuse the earlier evaluation, or re-run only some of its sections. Decks are only
+# matched against evaluations from the same ledger session: another founder's evaluation (and
+# its ID, which is enough to open it) is never offered.
+SIMILAR_DECKS = os.environ.get("PITCHME_SIMILAR_DECKS", "1") != "0"
+SIMILARITY_INDEX_PATH = CACHE_DIR / "similarity.sqlite3"
+# Estimated share of shingles two decks have in common from which the earlier evaluation is offered
+SIMILARITY_THRESHOLD = float(os.environ.get("PITCHME_SIMILARITY_THRESHOLD", "0.8"))
+SHINGLE_WORDS = 5
+# 16 bands of 8 rows: decks 0.8 similar share a bucket 95% of the time, 0.9 similar practically
+# always, 0.5 similar 6% of the time. Changing these invalidates the stored signatures.
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+MINHASH_CHUNK_SHINGLES = 4096
+_MERSENNE_PRIME = (1 << 61) - 1
+
+# Hash function parameters of the signatures, fixed so signatures from earlier runs stay comparable
+@st.cache_resource(show_spinner=False)
+def _minhash_permutations():
+    import numpy as np
+    rng = np.random.RandomState(1)
+    return (
+        rng.randint(1, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64),
+        rng.randint(0, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64),
+    )
+
+# MinHash signature of a deck's word shingles, or None for a deck without text
+def deck_signature(pitch_deck_text):
+    import numpy as np
+    words = normalize_deck_text(pitch_deck_text).lower().split()
+    if not words:
         return None
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    a, b = _minhash_permutations()
+    signature = np.full(MINHASH_PERMUTATIONS, 0xFFFFFFFF, dtype=np.uint64)
+    # Permute in chunks so a very large deck doesn't build one huge shingles x permutations matrix
+    for start in range(0, len(hashes), MINHASH_CHUNK_SHINGLES):
+        chunk = hashes[start:start + MINHASH_CHUNK_SHINGLES]
+        permuted = (np.outer(chunk, a) + b) % _MERSENNE_PRIME & 0xFFFFFFFF
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+# LSH bucket of each band of a signature, as signed 64-bit integers for SQLite
+def _lsh_buckets(signature):
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return [
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(),
+            "big", signed=True
+        )
+        for band in range(LSH_BANDS)
+    ]
 
-    return results
-
-# Function to display evaluation results in tabs
-def display_evaluation_results(results):
+# Create the similarity index database and its tables, once per process
+@st.cache_resource(show_spinner=False)
+def _create_similarity_index():
+    SIMILARITY_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(SIMILARITY_INDEX_PATH, timeout=30)) as conn, conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS decks ("
+            "id INTEGER PRIMARY KEY, job_id TEXT NOT NULL UNIQUE, signature BLOB NOT NULL, created REAL NOT NULL, "
+            "session TEXT)"
+        )
+        # Added after the table: the ledger session that ran the evaluation (NULL rows never match)
+        if "session" not in {row[1] for row in conn.execute("PRAGMA table_info(decks)")}:
+            conn.execute("ALTER TABLE decks ADD COLUMN session TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS decks_created ON decks (created)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "bucket INTEGER NOT NULL, deck INTEGER NOT NULL, PRIMARY KEY (bucket, deck)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS buckets_deck ON buckets (deck)")
+    return True
+
+# Open the similarity index database
+def _open_similarity_index():
+    _create_similarity_index()
+    return sqlite3.connect(SIMILARITY_INDEX_PATH, timeout=30)
+
+def _remove_indexed_decks(conn, deck_ids):
+    conn.executemany("DELETE FROM buckets WHERE deck = ?", [(deck_id,) for deck_id in deck_ids])
+    conn.executemany("DELETE FROM decks WHERE id = ?", [(deck_id,) for deck_id in deck_ids])
+
+# Add a finished evaluation's deck to the index under its ledger session and drop decks whose
+# jobs have expired. Evaluations without a session are not indexed.
+def index_evaluation(job_id, pitch_deck_text, session):
+    signature = deck_signature(pitch_deck_text)
+    if signature is None or not session:
+        return
+    try:
+        with closing(_open_similarity_index()) as conn, conn:
+            now = time.time()
+            # A retried job replaces its earlier entry
+            stale = [row[0] for row in conn.execute(
+                "SELECT id FROM decks WHERE created < ? OR job_id = ?", (now - JOB_RETENTION_SECONDS, job_id)
+            )]
+            _remove_indexed_decks(conn, stale)
+            deck_id = conn.execute(
+                "INSERT INTO decks (job_id, signature, created, session) VALUES (?, ?, ?, ?)",
+                (job_id, signature.tobytes(), now, session)
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO buckets (bucket, deck) VALUES (?, ?)",
+                [(bucket, deck_id) for bucket in _lsh_buckets(signature)]
+            )
+    except sqlite3.Error:
+        pass
+
+# The most similar earlier evaluation of `session` at or above the threshold whose job still
+# has results, as {"job_id", "similarity", "created", "results"}, or None
+def find_similar_evaluation(pitch_deck_text, session, threshold=None):
+    import numpy as np
+    if threshold is None:
+        threshold = SIMILARITY_THRESHOLD
+    with trace_span("find_similar") as span:
+        signature = deck_signature(pitch_deck_text)
+        if signature is None or not session:
+            return None
+        buckets = _lsh_buckets(signature)
+        try:
+            with closing(_open_similarity_index()) as conn:
+                candidates = conn.execute(
+                    "SELECT DISTINCT decks.id, decks.job_id, decks.signature, decks.created "
+                    "FROM buckets JOIN decks ON decks.id = buckets.deck "
+                    f"WHERE buckets.bucket IN ({', '.join('?' * len(buckets))}) AND decks.session = ?",
+                    buckets + [session]
+                ).fetchall()
+        except sqlite3.Error:
+            return None
+        span["candidates"] = len(candidates)
+        scored = []
+        for deck_id, job_id, stored, created in candidates:
+            similarity = float(np.mean(np.frombuffer(stored, dtype=np.uint32) == signature))
+            if similarity >= threshold:
+                scored.append((similarity, created, deck_id, job_id))
+        lost = []
+        match = None
+        for similarity, created, deck_id, job_id in sorted(scored, reverse=True):
+            job = load_job(job_id)
+            results = job_results(job) if job else None
+            if results:
+                match = {"job_id": job_id, "similarity": similarity, "created": created, "results": results}
+                break
+            lost.append(deck_id)
+        # Jobs can disappear before the index expires them (a cleared job store, for instance)
+        if lost:
+            try:
+                with closing(_open_similarity_index()) as conn, conn:
+                    _remove_indexed_decks(conn, lost)
+            except sqlite3.Error:
+                pass
+        span["similarity"] = round(match["similarity"], 3) if match else None
+        return match
+
+# The sections to run again when `selected` are re-run: also every section that builds on one of them
+def sections_to_rerun(selected):
+    rerun = set(selected)
+    changed = True
+    while changed:
+        changed = False
+        for key, dependencies in SECTION_DEPENDENCIES.items():
+            if key not in rerun and rerun.intersection(dependencies):
+                rerun.add(key)
+                changed = True
+    return rerun
+
+# Run the evaluation on the job workers and follow it by ID
+def start_evaluation(pitch_deck_text, analyze_design, info, completed=None):
+    job_id = submit_evaluation_job(pitch_deck_text, analyze_design, info, completed)
+    st.session_state.pop("similar_offer", None)
+    st.session_state.job_id = job_id
+    st.query_params["job"] = job_id
+    st.rerun()
+
+# Clear the session (and the job ID in the URL) to go back to the upload screen.
+# The ledger session ID is kept so the session budget covers every evaluation in it.
+def reset_session():
+    for key in list(st.session_state.keys()):
+        if key != "ledger_session":
+            del st.session_state[key]
+    st.query_params.clear()
+    st.rerun()
+
+# Show the progress of a running job; once it is done its results move into the session
+def display_evaluation_job(job_id):
+    job = load_job(job_id)
+    if job is None:
+        st.error(f"No evaluation found with ID {job_id}.")
+        if st.button("Start over", type="primary"):
+            reset_session()
+        return
+
+    if job["status"] == "done" or (job["status"] == "partial" and job_results(job)):
+        results = job_results(job)
+        st.session_state.evaluation_results = results
+        st.session_state.evaluation_missing = missing_sections(results, job["info"]["analyze_design"])
+        st.session_state.evaluation_error = job["error"]
+        st.session_state.evaluation_retryable = job["retryable"]
+        st.session_state.evaluation_retry_refusal = retry_budget_refusal(
+            job["deck_text"], st.session_state.evaluation_missing, job["info"].get("session")
+        )
+        st.session_state.evaluation_segments = parse_results_segments(results)
+        st.session_state.evaluation_reused = job["info"].get("reused_from")
+        submit_pdf_report(results)
+        st.rerun()
+
+    st.title("Analyzing your pitch deck...")
+    st.caption(f"Evaluation ID: `{job_id}`. You can leave this page and come back with this link or ID.")
+    compaction = job["info"].get("compaction")
+    if compaction:
+        st.caption(
+            f"Deck compacted from {compaction['chars_before']:,} to {compaction['chars_after']:,} characters "
+            f"(~{compaction['tokens_before']:,} → ~{compaction['tokens_after']:,} tokens per analysis)"
+            + (", truncated to fit the token budget" if compaction["truncated"] else "")
+        )
+
+    expected = [s for s in EVALUATION_SECTIONS if s["key"] in job["info"]["sections"]]
+    finished = sum(1 for s in expected if job["sections"].get(s["key"], {}).get("status") == "done")
+    st.progress(int(finished * 100 / len(expected)))
+    for section in expected:
+        progress = job["sections"].get(section["key"])
+        if progress is None:
+            st.markdown(f"⏳ {section['label']}")
+        elif progress["status"] == "done":
+            st.markdown(f"✅ {section['label']}")
+        elif progress["status"] == "failed":
+            st.markdown(f"❌ {section['label']}")
+        else:
+            with st.expander(f"✍️ {section['label']}", expanded=True):
+                st.markdown(progress["text"] + " ▌")
+
+    if job["status"] in ("queued", "running") and time.time() - job["updated"] > JOB_STALE_SECONDS:
+        latest = max([job["updated"]] + [s["updated"] for s in job["sections"].values()])
+        if time.time() - latest > JOB_STALE_SECONDS:
+            job["status"] = "failed"
+            job["error"] = "This evaluation stopped making progress. Please start it again."
+    if job["status"] in ("failed", "partial"):
+        st.error(job["error"] or "The evaluation failed.")
+        # Nothing finished, but the sections can be tried again if their failures were transient,
+        # unless the budget would refuse them as well
+        refusal = None
+        if job["retryable"]:
+            refusal = retry_budget_refusal(
+                job["deck_text"], missing_sections(job_results(job), job["info"]["analyze_design"]),
+                job["info"].get("session")
+            )
+            if refusal and refusal not in (job["error"] or ""):
+                st.error(refusal)
+        if job["retryable"] and not refusal and st.button("Retry failed sections", type="primary"):
+            retry_evaluation_job(job_id)
+            st.rerun()
+        if st.button("Start over"):
+            reset_session()
+        return
+    # Poll the store again shortly
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
+# Offer the evaluation of a near-duplicate deck: reuse it as is, re-run some of its sections, or start over
+def display_similar_offer(offer):
+    match = offer["match"]
+    sections = [s for s in EVALUATION_SECTIONS if offer["analyze_design"] or s["key"] != "design"]
+    labels = {s["key"]: s["label"] for s in sections}
+    reusable = [s["key"] for s in sections if s["key"] in match["results"]]
+    new_sections = [s["key"] for s in sections if s["key"] not in match["results"]]
+    evaluated = time.strftime("%Y-%m-%d %H:%M", time.localtime(match["created"]))
+
+    st.title("This deck looks familiar")
+    st.markdown(
+        f"It is about **{match['similarity']:.0%}** similar to a deck evaluated on {evaluated} "
+        f"(evaluation `{match['job_id']}`). You can reuse that evaluation, run only the analyses "
+        "your changes affect again, or evaluate the deck from scratch."
+    )
+    selected = st.multiselect("Analyses to run again", reusable, format_func=labels.get)
+    rerun = sections_to_rerun(selected)
+    if rerun - set(selected):
+        st.caption("Also run again, as they build on the analyses above: " + ", ".join(
+            labels[key] for key in reusable if key in rerun - set(selected)
+        ))
+    if new_sections:
+        st.caption("Not in the earlier evaluation, so run now: " + ", ".join(labels[key] for key in new_sections))
+
+    completed = {key: match["results"][key] for key in reusable if key not in rerun}
+    info = dict(offer["info"], reused_from={
+        "job_id": match["job_id"], "similarity": round(match["similarity"], 3), "sections": list(completed),
+    })
+    to_run = len(sections) - len(completed)
+    reuse_label = f"Reuse {len(completed)} analyses, run {to_run}" if to_run else "Reuse the earlier evaluation"
+    col1, col2, col3 = st.columns(3)
+    if col1.button(reuse_label, type="primary", use_container_width=True, disabled=not completed):
+        start_evaluation(offer["deck_text"], offer["analyze_design"], info, completed)
+    if col2.button("Evaluate from scratch", use_container_width=True):
+        start_evaluation(offer["deck_text"], offer["analyze_design"], offer["info"])
+    if col3.button("Cancel", use_container_width=True):
+        reset_session()
+
+# Split a section's markdown into the segments it is rendered from: ("markdown", text) chunks
+# and ("mermaid", source, source_hash) diagrams. Parsed once when the section arrives so
+# reruns of the results page only iterate over the list.
+def parse_section_segments(content):
+    segments = []
+    markdown_lines = []
+    mermaid_lines = None
+    for line in content.split('\n'):
+        if mermaid_lines is None and line.strip() == "```mermaid":
+            if "\n".join(markdown_lines).strip():
+                segments.append(("markdown", "\n".join(markdown_lines)))
+            markdown_lines = []
+            mermaid_lines = []
+        elif mermaid_lines is not None and line.strip() == "```":
+            source = "\n".join(mermaid_lines)
+            segments.append(("mermaid", source, hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]))
+            mermaid_lines = None
+        elif mermaid_lines is not None:
+            mermaid_lines.append(line)
+        else:
+            markdown_lines.append(line)
+    # An unterminated diagram is shown as a code block rather than dropped
+    if mermaid_lines is not None:
+        markdown_lines = ["```mermaid"] + mermaid_lines + ["```"]
+    if "\n".join(markdown_lines).strip():
+        segments.append(("markdown", "\n".join(markdown_lines)))
+    return segments
+
+# Segments for every section in a results dict
+def parse_results_segments(results):
+    return {key: parse_section_segments(content) for key, content in results.items()}
+
+# Draw one mermaid diagram. The key is derived from the source hash, so the component stays
+# mounted across reruns that keep drawing it (e.g. while the same section stays selected).
+# Switching sections remounts the diagrams: a keyed component not drawn in a run is dropped.
+def render_mermaid_diagram(source, source_hash, occurrence=0):
+    from streamlit_mermaid import st_mermaid
+    st_mermaid(source, key=f"mermaid-{source_hash}-{occurrence}")
+
+# Function to display evaluation results, one section at a time
+def display_evaluation_results(results, segments=None):
     st.title("Pitch Deck Evaluation")
-    # Define all possible tabs and their keys
-    tab_definitions = [
-        {"label": "📖 Story Analysis", "key": "story"},
-        {"label": "🚀 Startup Stage", "key": "startup_stage"},
-        {"label": "🎯 Market Entry", "key": "market_entry"},
-        {"label": "💼 Business Model", "key": "business_model"},
-        {"label": "👥 Expert Panel", "key": "expert_panel"},
-        {"label": "🎨 Design Analysis", "key": "design"},
-        {"label": "📝 Overall Feedback", "key": "overall_feedback"}
-    ]
-    # Filter to include only tabs with results
-    available_tabs = [tab for tab in tab_definitions if tab["key"] in results]
-    tab_labels = [tab["label"] for tab in available_tabs]
-    # Create tabs
-    tabs = st.tabs(tab_labels)
-    # Populate each tab with content
-    for i, tab in enumerate(available_tabs):
-        with tabs[i]:
-            content = results[tab["key"]]
-            
-            # Regular markdown content (without mermaid)
-            markdown_parts = []
-            
-            # Extract mermaid diagrams
-            mermaid_blocks = []
-            in_mermaid = False
-            current_mermaid = []
-            
-            for line in content.split('\n'):
-                if line.strip() == "```mermaid":
-                    in_mermaid = True
-                elif line.strip() == "```" and in_mermaid:
-                    in_mermaid = False
-                    mermaid_blocks.append('\n'.join(current_mermaid))
-                    current_mermaid = []
-                    # Add a placeholder for the mermaid diagram
-                    markdown_parts.append("[MERMAID_DIAGRAM_" + str(len(mermaid_blocks) - 1) + "]")
-                elif in_mermaid:
-                    current_mermaid.append(line)
-                else:
-                    markdown_parts.append(line)
-            
-            # Join the markdown parts into a single string
-            markdown_content = '\n'.join(markdown_parts)
-            
-            # Split by mermaid diagram placeholders
-            markdown_segments = markdown_content.split("[MERMAID_DIAGRAM_")
-            
-            # Render first segment
-            if markdown_segments[0]:
-                st.markdown(markdown_segments[0])
-            
-            # Render the rest with mermaid diagrams
-            for i, segment in enumerate(markdown_segments[1:], 0):
-                idx, rest = segment.split("]", 1)
-                
-                # Render the mermaid diagram
-                st_mermaid(mermaid_blocks[int(idx)])
-                
-                # Render the rest of the markdown
-                if rest:
-                    st.markdown(rest)
+    if segments is None:
+        segments = parse_results_segments(results)
+    # Filter to include only sections with results
+    available_sections = [section for section in EVALUATION_SECTIONS if section["key"] in results]
+    labels = {section["key"]: section["label"] for section in available_sections}
+    # Only the selected section is built; the others cost nothing until they are opened
+    selected = st.radio(
+        "Section",
+        list(labels),
+        format_func=labels.get,
+        horizontal=True,
+        key="results_section",
+        label_visibility="collapsed"
+    )
+    with trace_span("render_results", section=selected):
+        section_segments = segments.get(selected)
+        if section_segments is None:
+            section_segments = segments[selected] = parse_section_segments(results[selected])
+
+        # Paint the text first and mount the diagrams into their slots afterwards
+        pending_diagrams = []
+        for segment in section_segments:
+            if segment[0] == "mermaid":
+                pending_diagrams.append((st.empty(), segment))
+            else:
+                st.markdown(segment[1])
+        seen = Counter()
+        for slot, (_, source, source_hash) in pending_diagrams:
+            with slot.container():
+                render_mermaid_diagram(source, source_hash, seen[source_hash])
+            seen[source_hash] += 1
+
+# Record how long this script run took, warning when the upload screen goes over its budget
+def record_rerun_time(screen):
+    elapsed_ms = (time.perf_counter() - _script_started) * 1000
+    st.session_state["last_rerun"] = {"screen": screen, "ms": elapsed_ms, "import_ms": IMPORT_SECONDS * 1000}
+    if screen == "upload" and elapsed_ms > RERUN_BUDGET_MS:
+        logging.getLogger(__name__).warning(
+            "Upload screen rerun took %.0f ms (budget %d ms, imports %.0f ms)",
+            elapsed_ms, RERUN_BUDGET_MS, IMPORT_SECONDS * 1000
+        )
 
 def main():
+    screen = "upload"
+    # Identifies this browser session in the usage ledger for the per-session budget
+    if "ledger_session" not in st.session_state:
+        st.session_state.ledger_session = uuid.uuid4().hex[:12]
     # Sidebar
     with st.sidebar:
         # Display company logo at the top
@@ -869,13 +3009,116 @@ def main():
             5. Review the detailed analysis across various tabs
             6. Use the feedback to improve your pitch deck
             """)
+        with st.expander("📊 Cache & token usage"):
+            cache_stats = get_result_cache_stats()
+            lookups = cache_stats["hits"] + cache_stats["misses"]
+            hit_rate = cache_stats["hits"] / lookups if lookups else 0
+            st.markdown(f"""
+            - **Hits**: {cache_stats["hits"]} ({hit_rate:.0%} of lookups)
+            - **Misses**: {cache_stats["misses"]}
+            - **Evictions**: {cache_stats["evictions"]}
+            - **Stored**: {cache_stats["entries"]} results, {cache_stats["bytes"] / 1024:.0f} KB
+            """)
+            token_usage = get_token_usage()
+            st.markdown(f"""
+            - **Input tokens**: {token_usage["input_tokens"]:,}
+            - **Prompt cache writes**: {token_usage["cache_creation_input_tokens"]:,} tokens
+            - **Prompt cache reads**: {token_usage["cache_read_input_tokens"]:,} tokens
+            - **Output tokens**: {token_usage["output_tokens"]:,}
+            """)
+            limiter_stats = get_rate_limiter_stats()
+            st.markdown(f"""
+            - **API queue depth**: {limiter_stats["queue_depth"]}
+            - **Average queue wait**: {limiter_stats["average_wait"]:.1f}s (max {limiter_stats["max_wait"]:.1f}s)
+            - **Rate-limit pauses**: {limiter_stats["throttled"]}
+            """)
+            single_flight = get_single_flight_stats()
+            st.markdown(f"""
+            - **Calls in flight**: {single_flight["in_flight"]}
+            - **Duplicate calls shared**: {single_flight["followers"]} (of {single_flight["leaders"] + single_flight["followers"]} uncached)
+            """)
+            peak_rss = peak_rss_bytes()
+            if peak_rss:
+                st.markdown(f"- **Peak server memory**: {peak_rss / (1024 * 1024):.0f} MB")
+            last_rerun = st.session_state.get("last_rerun")
+            if last_rerun:
+                st.markdown(
+                    f"- **Last {last_rerun['screen']} render**: {last_rerun['ms']:.0f} ms "
+                    f"(imports {last_rerun['import_ms']:.0f} ms, upload screen budget {RERUN_BUDGET_MS} ms)"
+                )
+        with st.expander("💰 Usage & cost"):
+            ledger = get_ledger_summary(st.session_state.ledger_session)
+            daily_limit = f" of ${DAILY_BUDGET_USD:.2f}" if DAILY_BUDGET_USD else ""
+            session_limit = f" of ${SESSION_BUDGET_USD:.2f}" if SESSION_BUDGET_USD else ""
+            st.markdown(f"""
+            - **Spent today**: ${ledger["today"]:.3f}{daily_limit}
+            - **Spent this session**: ${ledger["session"]:.3f}{session_limit}
+            """)
+            if ledger["by_section"]:
+                rows = ["| Section | Calls | Tokens in / out | Cost | Per call |", "|---|---|---|---|---|"]
+                for row in ledger["by_section"]:
+                    rows.append(
+                        f"| {row['section']} | {row['calls']} | {row['input_tokens']:,} / {row['output_tokens']:,} | "
+                        f"${row['cost_usd']:.3f} | ${row['average_usd']:.4f} |"
+                    )
+                st.markdown("\n".join(rows))
+            if ledger["by_evaluation"]:
+                rows = ["| Evaluation | Deck | Started | Calls | Cost |", "|---|---|---|---|---|"]
+                for row in ledger["by_evaluation"]:
+                    started = time.strftime("%m-%d %H:%M", time.localtime(row["started"]))
+                    rows.append(
+                        f"| `{row['evaluation']}` | `{(row['deck'] or '')[:8]}` | {started} | {row['calls']} | "
+                        f"${row['cost_usd']:.3f} |"
+                    )
+                st.markdown("\n".join(rows))
+            st.caption("Last 7 days of API calls. Cached and shared results cost nothing.")
+        with st.expander("⏱️ Latency"):
+            summary = get_trace_summary()
+            if summary:
+                rows = ["| Span | Section | Runs | p50 / p95 | First token p50 / p95 |", "|---|---|---|---|---|"]
+                for row in summary:
+                    ttft = f"{row['ttft_p50']:.1f}s / {row['ttft_p95']:.1f}s" if row["ttft_p50"] is not None else ""
+                    rows.append(
+                        f"| {row['span']} | {row['section']} | {row['count']} | "
+                        f"{row['p50']:.2f}s / {row['p95']:.2f}s | {ttft} |"
+                    )
+                st.markdown("\n".join(rows))
+            else:
+                st.caption("No traced work in this process yet.")
+            st.caption(f"Spans are logged to `{TRACE_LOG_PATH}`.")
+        with st.expander("🧭 Section routing"):
+            # Observed output lengths next to each budget, for tuning SECTION_ROUTES
+            output_stats = get_section_output_stats()
+            rows = ["| Section | Model | Budget | Observed p50 / p95 | Hit limit | Suggested |", "|---|---|---|---|---|---|"]
+            for section in EVALUATION_SECTIONS:
+                route = SECTION_ROUTES[section["key"]]
+                observed = output_stats.get(section["key"])
+                model = route["model"] + (f" → {route['fallback_model']}" if route["fallback_model"] else "")
+                if observed:
+                    rows.append(
+                        f"| {section['label']} | {model} | {route['max_tokens']:,} | "
+                        f"{observed['p50']:,} / {observed['p95']:,} ({observed['count']} runs) | "
+                        f"{observed['hit_limit']:.0%} | {observed['suggested_max_tokens']:,} |"
+                    )
+                else:
+                    rows.append(f"| {section['label']} | {model} | {route['max_tokens']:,} | no data yet | | |")
+            st.markdown("\n".join(rows))
         st.divider()
         st.markdown("<div style='text-align: center; font-size: 0.9rem; opacity: 0.8; margin-top: 20px;'>Made by ProtoBots.ai</div>", unsafe_allow_html=True)
     
     # Use container to dynamically update content without page refresh
     main_container = st.container()
     with main_container:
-        if "evaluation_results" not in st.session_state:
+        # A job ID in the URL reattaches to an evaluation after a refresh or reconnect
+        if "job_id" not in st.session_state and "job" in st.query_params:
+            st.session_state.job_id = st.query_params["job"]
+        if "evaluation_results" not in st.session_state and "job_id" in st.session_state:
+            screen = "job"
+            display_evaluation_job(st.session_state.job_id)
+        elif "evaluation_results" not in st.session_state and "similar_offer" in st.session_state:
+            screen = "similar"
+            display_similar_offer(st.session_state.similar_offer)
+        elif "evaluation_results" not in st.session_state:
             # Initial state - show upload form
             # Replace the blank banner with grey horizontal lines and title/subtitle
             st.markdown("<hr style='border: none; height: 2px; background: #ccc; box-shadow: 0 2px 2px -2px grey;'>", unsafe_allow_html=True)
@@ -903,33 +3146,32 @@ def main():
                     }
                     </style>""", unsafe_allow_html=True)
                     if st.button("Evaluate Pitch Deck", type="primary", use_container_width=True):
-                        pitch_deck_text = extract_text_from_file(uploaded_file)
+                        screen = "evaluation"
+                        slides = extract_slides_from_file(uploaded_file)
+                        pitch_deck_text = slides_to_text(slides, file_type) if slides is not None else None
                         if not pitch_deck_text or len(pitch_deck_text) < 100:
                             st.error("Could not extract sufficient text from the file. Please make sure your file has textual content and not just images.")
                         else:
                             st.session_state.startup_name = startup_name
-                            analysis_status = st.empty()
-                            with analysis_status.container():
-                                with st.spinner("Analyzing your pitch deck..."):
-                                    results = evaluate_pitch_deck(pitch_deck_text, analyze_design)
-                                    if results:
-                                        st.session_state.evaluation_results = results
-                                        st.success("Analysis complete! Displaying results...")
-                                        time.sleep(1)
-                                        main_container.empty()
-                                        display_evaluation_results(results)
-                                        # Add download button to export analysis as PDF
-                                        pdf_bytes = export_results_to_pdf(st.session_state.evaluation_results)
-                                        st.download_button(
-                                            label="Export Analysis as PDF",
-                                            data=pdf_bytes,
-                                            file_name="PitchMe_Analysis.pdf",
-                                            mime="application/pdf"
-                                        )
-                                        if st.button("Evaluate Another Pitch Deck", type="primary"):
-                                            for key in list(st.session_state.keys()):
-                                                del st.session_state[key]
-                                            st.rerun()
+                            pitch_deck_text, compaction = compact_deck_text(pitch_deck_text, slides=slides)
+                            info = {"compaction": compaction, "session": st.session_state.ledger_session}
+                            match = find_similar_evaluation(pitch_deck_text, st.session_state.ledger_session) if SIMILAR_DECKS else None
+                            if match:
+                                # Offer the earlier evaluation before paying for a new one
+                                st.session_state.similar_offer = {
+                                    "deck_text": pitch_deck_text,
+                                    "analyze_design": analyze_design,
+                                    "info": info,
+                                    "match": match,
+                                }
+                                st.rerun()
+                            start_evaluation(pitch_deck_text, analyze_design, info)
+                with st.expander("Resume an evaluation"):
+                    resume_id = st.text_input("Evaluation ID", "")
+                    if st.button("Resume") and resume_id.strip():
+                        st.session_state.job_id = resume_id.strip()
+                        st.query_params["job"] = resume_id.strip()
+                        st.rerun()
                 st.markdown("</div>", unsafe_allow_html=True)
             with col2:
                 st.markdown("<div class='features-section'>", unsafe_allow_html=True)
@@ -955,11 +3197,47 @@ def main():
                 """)
                 st.markdown("</div>", unsafe_allow_html=True)
         else:
-            display_evaluation_results(st.session_state.evaluation_results)
+            screen = "results"
+            if "evaluation_segments" not in st.session_state:
+                st.session_state.evaluation_segments = parse_results_segments(st.session_state.evaluation_results)
+            missing = st.session_state.get("evaluation_missing")
+            if missing:
+                labels = ", ".join(s["label"] for s in EVALUATION_SECTIONS if s["key"] in missing)
+                st.warning(f"Some analyses could not be completed: {labels}. The results below are partial.")
+                error = st.session_state.get("evaluation_error")
+                if error:
+                    st.caption(error)
+                refusal = st.session_state.get("evaluation_retry_refusal")
+                if refusal:
+                    if refusal not in (error or ""):
+                        st.error(refusal)
+                elif (st.session_state.get("evaluation_retryable") and "job_id" in st.session_state
+                      and st.button("Retry failed sections", type="primary")):
+                    retry_evaluation_job(st.session_state.job_id)
+                    for key in ("evaluation_results", "evaluation_segments", "evaluation_missing", "evaluation_reused",
+                                "evaluation_error", "evaluation_retryable", "evaluation_retry_refusal",
+                                "results_section"):
+                        st.session_state.pop(key, None)
+                    st.rerun()
+            display_evaluation_results(st.session_state.evaluation_results, st.session_state.evaluation_segments)
+            # Served from the memoized background build, so reruns don't rebuild the report
+            st.download_button(
+                label="Export Analysis as PDF",
+                data=submit_pdf_report(st.session_state.evaluation_results).result(),
+                file_name="PitchMe_Analysis.pdf",
+                mime="application/pdf"
+            )
+            if "job_id" in st.session_state:
+                st.caption(f"API cost of this evaluation: ${get_evaluation_cost(st.session_state.job_id):.3f}")
+            reused = st.session_state.get("evaluation_reused")
+            if reused:
+                st.caption(
+                    f"{len(reused['sections'])} of the analyses were reused from evaluation `{reused['job_id']}` "
+                    f"of a {reused['similarity']:.0%} similar deck."
+                )
             if st.button("Evaluate Another Pitch Deck", type="primary"):
-                for key in list(st.session_state.keys()):
-                    del st.session_state[key]
-                st.experimental_rerun()
+                reset_session()
+    record_rerun_time(screen)
 
 if __name__ == "__main__":
     main()
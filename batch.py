@@ -0,0 +1,195 @@
+# Headless batch evaluation of many pitch decks, reusing the analysis pipeline from app.py.
+#
+#   python batch.py decks/ --output-dir results/ --concurrency 4
+#   python batch.py "cohort/*.pdf" --stub
+#
+# Each deck gets <name>.json (the section results) and <name>.pdf (the exported report).
+# Finished decks are appended to a JSONL manifest so an interrupted run can be resumed.
+# Decks where some sections failed are recorded as "partial"; the next run only retries those sections.
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+SUPPORTED_EXTENSIONS = {".pdf", ".ppt", ".pptx", ".doc", ".docx"}
+
+# File on disk that looks enough like a Streamlit upload for the extractors
+class DeckFile:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.name = self.path.name
+        self._data = self.path.read_bytes()
+        self.size = len(self._data)
+
+    def getvalue(self):
+        return self._data
+
+# Expand the command-line inputs (directories or glob patterns) into a sorted list of decks
+def find_decks(inputs):
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            candidates = Path(pattern).rglob("*")
+        else:
+            candidates = (Path(p) for p in glob.glob(pattern, recursive=True))
+        for path in candidates:
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                paths.add(path.resolve())
+    return sorted(paths)
+
+# Latest manifest entry of every deck, keyed by path and content hash
+def load_manifest(manifest_path):
+    entries = {}
+    if manifest_path.exists():
+        with open(manifest_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[(entry["file"], entry["sha256"])] = entry
+    return entries
+
+# Section results saved by an earlier partial run of a deck, so only its failed sections run again
+def load_partial_results(entry):
+    if not entry or entry.get("status") != "partial" or not entry.get("results"):
+        return None
+    try:
+        return json.loads(Path(entry["results"]).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+# Evaluate one deck and write its results and PDF report, returning its manifest entry
+def evaluate_deck(app, path, output_dir, analyze_design, section_concurrency, completed=None):
+    started = time.monotonic()
+    deck = DeckFile(path)
+    digest = hashlib.sha256(deck.getvalue()).hexdigest()
+    entry = {"file": str(path), "sha256": digest, "status": "failed"}
+    output_name = f"{path.stem}-{digest[:8]}"
+
+    slides = app.extract_slides_from_file(deck)
+    pitch_deck_text = app.slides_to_text(slides, path.suffix.lstrip(".").lower()) if slides is not None else None
+    if not pitch_deck_text or len(pitch_deck_text) < 100:
+        entry["error"] = "Could not extract sufficient text from the file."
+    else:
+        pitch_deck_text, compaction = app.compact_deck_text(pitch_deck_text, slides=slides)
+        entry["compaction"] = compaction
+        # Billed in the usage ledger as one evaluation per deck file, outside any session: the
+        # session budget is meant for a browser session, so batch runs only count against the daily one
+        evaluation = f"batch-{digest[:12]}"
+        causes = []
+        with app.ledger_context(session=None, evaluation=evaluation, deck=app.deck_hash(pitch_deck_text)):
+            results = app.evaluate_pitch_deck(
+                pitch_deck_text,
+                analyze_design,
+                max_concurrency=section_concurrency,
+                completed=completed,
+                on_section_failed=lambda key, error, cause: cause and causes.append(str(cause))
+            )
+        entry["cost_usd"] = round(app.get_evaluation_cost(evaluation), 4)
+        if results is None:
+            entry["error"] = "The deck could not be condensed for analysis."
+        elif results:
+            # Partial results are kept on disk; the report is only built once every section is in
+            results_path = output_dir / f"{output_name}.json"
+            results_path.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+            entry["results"] = str(results_path)
+            missing = app.missing_sections(results, analyze_design)
+            if missing:
+                error = f"{len(missing)} analyses failed: {', '.join(missing)}"
+                entry.update(status="partial", failed_sections=missing,
+                             error=f"{error}. {causes[0]}" if causes else error)
+            else:
+                pdf_path = output_dir / f"{output_name}.pdf"
+                pdf_path.write_bytes(app.export_results_to_pdf(results))
+                entry.update(status="ok", pdf=str(pdf_path))
+        else:
+            entry["error"] = f"All analyses failed. {causes[0]}" if causes else "All analyses failed."
+    entry["seconds"] = round(time.monotonic() - started, 2)
+    entry["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return entry
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a directory of pitch decks without the Streamlit UI.")
+    parser.add_argument("inputs", nargs="+", help="Directories or glob patterns of decks to evaluate")
+    parser.add_argument("--output-dir", default="pitchme_results", help="Where to write per-deck results and PDFs")
+    parser.add_argument("--manifest", help="JSONL manifest of finished decks (default: <output-dir>/manifest.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=2, help="Number of decks evaluated at the same time")
+    parser.add_argument("--section-concurrency", type=int, default=None, help="Concurrent section analyses per deck")
+    parser.add_argument("--no-design", action="store_true", help="Skip the design analysis section")
+    parser.add_argument("--stub", action="store_true", help="Use the local stub client instead of the Anthropic API")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds each stub call takes")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.stub:
+        # Canned stub answers must not reach the shared result cache or count in the real usage ledger
+        os.environ.setdefault("ANTHROPIC_API_KEY", "stub")
+        os.environ["PITCHME_CACHE_DIR"] = tempfile.mkdtemp(prefix="pitchme-stub-")
+    elif not os.environ.get("ANTHROPIC_API_KEY"):
+        print("ANTHROPIC_API_KEY must be set (or use --stub)", file=sys.stderr)
+        return 2
+    import app
+    # Streamlit calls are no-ops outside `streamlit run`; silence their missing-context warnings
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    if args.stub:
+        from stub_client import StubAnthropic
+        app.client = StubAnthropic(latency=args.stub_latency)
+    # The rate limiter's bucket lives in the cache directory, shared with a running app that uses
+    # the same directory. Batch calls wait while the app has interactive calls queued.
+    app.DEFAULT_CALL_PRIORITY = app.PRIORITY_BATCH
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = Path(args.manifest) if args.manifest else output_dir / "manifest.jsonl"
+    manifest = load_manifest(manifest_path)
+
+    decks = find_decks(args.inputs)
+    pending = {}
+    for path in decks:
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        entry = manifest.get((str(path), digest))
+        if not entry or entry.get("status") != "ok":
+            pending[path] = load_partial_results(entry)
+    resumed = sum(1 for completed in pending.values() if completed)
+    print(f"{len(decks)} decks found, {len(decks) - len(pending)} already done, {len(pending)} to evaluate"
+          + (f" ({resumed} resuming from partial results)" if resumed else ""))
+
+    manifest_lock = threading.Lock()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = {
+            executor.submit(
+                evaluate_deck, app, path, output_dir, not args.no_design, args.section_concurrency, completed
+            ): path
+            for path, completed in pending.items()
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                entry = {"file": str(path), "sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+                         "status": "failed", "error": str(e)}
+            if entry["status"] != "ok":
+                failures += 1
+            with manifest_lock, open(manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            print(f"[{done}/{len(pending)}] {entry['status']:6} {path.name} {entry.get('error', '')}".rstrip())
+
+    print(f"Finished: {len(pending) - failures} succeeded, {failures} failed. Manifest: {manifest_path}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
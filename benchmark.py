@@ -0,0 +1,251 @@
+# Offline benchmarks for the analysis pipeline, run against synthetic decks and the stub client.
+#
+#   python benchmark.py                                # every benchmark, results saved to benchmark_results/
+#   python benchmark.py --only extract --slides 5 300 --repeat 5
+#   python benchmark.py --stub-latency 1.0 --stub-token-rate 60 --stub-error-rate 0.05
+#   python benchmark.py --compare benchmark_results/20261017-120000-abc1234.json
+#
+# Each run is saved as a timestamped JSON file and compared with the previous one (or --compare),
+# flagging benchmarks whose median got slower than --threshold.
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+BENCHMARKS = ("extract", "evaluate", "parse", "export_pdf")
+
+# Median, mean, 95th percentile and extremes of a list of timings in seconds
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        "runs": len(ordered),
+        "min": ordered[0],
+        "median": ordered[len(ordered) // 2],
+        "mean": sum(ordered) / len(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+# Time `run` `repeat` times after `warmup` untimed runs. `setup` runs before every call, untimed.
+def measure(run, repeat, warmup=1, setup=None):
+    timings = []
+    for iteration in range(warmup + repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        run()
+        if iteration >= warmup:
+            timings.append(time.perf_counter() - started)
+    return timings
+
+# Cold extraction of each format and size (the shared PDF page cache is cleared between runs)
+def bench_extract(app, args):
+    import synthetic_decks
+    results = []
+    for file_format in args.formats:
+        for slides in args.slides:
+            upload = synthetic_decks.make_upload(file_format, slides)
+            chars = len(app.extract_text_from_file(upload) or "")
+
+            def clear_page_cache():
+                with app._page_text_cache_lock:
+                    app._page_text_cache.clear()
+
+            timings = measure(lambda: app.extract_text_from_file(upload), args.repeat, setup=clear_page_cache)
+            results.append({
+                "name": f"extract/{file_format}/{slides}",
+                "params": {"format": file_format, "slides": slides, "bytes": upload.size, "chars": chars},
+                **summarize(timings),
+            })
+    return results
+
+# Deck text of the given size, as the pipeline sees it after extraction and compaction
+def _deck_text(app, slides):
+    import synthetic_decks
+    text = app.extract_text_from_file(synthetic_decks.make_upload("pdf", slides))
+    return app.compact_deck_text(text)[0]
+
+# Full evaluate_pitch_deck against the stub. Each run gets a unique deck text so neither the
+# result cache nor in-flight sharing can answer it.
+def bench_evaluate(app, args):
+    results = []
+    for slides in args.slides:
+        deck = _deck_text(app, slides)
+        calls_before = app.client.messages.calls
+        errors_before = app.client.messages.errors
+
+        def run():
+            app.evaluate_pitch_deck(f"{deck}\n\nBenchmark run {uuid.uuid4().hex}", True)
+
+        timings = measure(run, args.repeat, warmup=0)
+        results.append({
+            "name": f"evaluate/{slides}",
+            "params": {
+                "slides": slides,
+                "deck_chars": len(deck),
+                "api_calls": app.client.messages.calls - calls_before,
+                "injected_errors": app.client.messages.errors - errors_before,
+            },
+            **summarize(timings),
+        })
+    return results
+
+# Results of one evaluation from the stub, padded to a realistic length, used by the
+# parsing and PDF benchmarks
+def _sample_results(app, args):
+    deck = _deck_text(app, min(args.slides))
+    return app.evaluate_pitch_deck(f"{deck}\n\nBenchmark sample {uuid.uuid4().hex}", True)
+
+# Markdown/mermaid segment parsing of every section, as done when results arrive on the page
+def bench_parse(app, args, results):
+    iterations = 100
+    timings = measure(lambda: [app.parse_results_segments(results) for _ in range(iterations)], args.repeat)
+    return [{
+        "name": "parse/results",
+        "params": {"sections": len(results), "chars": sum(map(len, results.values())), "iterations": iterations},
+        **summarize([t / iterations for t in timings]),
+    }]
+
+# PDF export of the sample results. Reports of the growing set of sections are built first (as
+# when failed sections are retried), and every build must succeed, so state leaking from one
+# build into the next shows up as an error rather than a fast time.
+def bench_export_pdf(app, args, results):
+    sections = list(results.items())
+    for count in range(1, len(sections)):
+        app.export_results_to_pdf(dict(sections[:count]))
+    reports = []
+    timings = measure(lambda: reports.append(app.export_results_to_pdf(results)), args.repeat)
+    if not all(pdf.startswith(b"%PDF") for pdf in reports):
+        raise RuntimeError("PDF export failed when rebuilding a report from sections exported before")
+    size = len(reports[-1])
+    return [{
+        "name": "export_pdf/results",
+        "params": {"sections": len(results), "bytes": size},
+        **summarize(timings),
+    }]
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Print each benchmark next to the baseline and return the names that got slower than threshold
+def compare(current, baseline, threshold):
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline.get('path', 'baseline')} (commit {baseline.get('git_commit') or '?'}):")
+    for result in current["results"]:
+        before = previous.get(result["name"])
+        if before is None:
+            print(f"  {result['name']:<28} {result['median'] * 1000:10.2f} ms   (new)")
+            continue
+        change = (result["median"] - before["median"]) / before["median"] if before["median"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  << slower"
+            regressions.append(result["name"])
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"  {result['name']:<28} {before['median'] * 1000:10.2f} ms -> {result['median'] * 1000:10.2f} ms"
+              f"  {change:+7.1%}{flag}")
+    return regressions
+
+# Most recent saved run in the results directory, other than `exclude`
+def latest_result(output_dir, exclude=None):
+    runs = sorted(path for path in Path(output_dir).glob("*.json") if path != exclude)
+    return runs[-1] if runs else None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PitchMe pipeline offline with synthetic decks.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--slides", type=int, nargs="+", default=[5, 50, 300], help="Deck sizes in slides")
+    parser.add_argument("--formats", nargs="+", choices=("pdf", "pptx", "docx"), default=["pdf", "pptx", "docx"],
+                        help="Deck formats for the extraction benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument("--stub-latency", type=float, default=0.3, help="Stub seconds to first token")
+    parser.add_argument("--stub-token-rate", type=float, default=400.0, help="Stub output tokens per second (0 = instant)")
+    parser.add_argument("--stub-output-tokens", type=int, default=600, help="Stub answer length in tokens")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Share of stub calls that fail")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for stub error injection")
+    parser.add_argument("--output-dir", default="benchmark_results", help="Where to save the results")
+    parser.add_argument("--compare", help="Results file to compare with (default: the previous run)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Median slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The benchmark never touches the API, the real caches or the API rate limits
+    os.environ.setdefault("ANTHROPIC_API_KEY", "stub")
+    os.environ["PITCHME_CACHE_DIR"] = tempfile.mkdtemp(prefix="pitchme-bench-")
+    os.environ.setdefault("PITCHME_RATE_LIMIT_RPM", "100000")
+    os.environ.setdefault("PITCHME_RATE_LIMIT_TPM", "1000000000")
+    import app
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    from stub_client import StubAnthropic
+    app.client = StubAnthropic(
+        latency=args.stub_latency,
+        token_rate=args.stub_token_rate,
+        output_tokens=args.stub_output_tokens,
+        error_rate=args.stub_error_rate,
+        seed=args.seed,
+    )
+
+    results = []
+    for name in args.only:
+        print(f"Running {name}...", flush=True)
+        if name == "extract":
+            results.extend(bench_extract(app, args))
+        elif name == "evaluate":
+            results.extend(bench_evaluate(app, args))
+        else:
+            sample = _sample_results(app, args)
+            results.extend(bench_parse(app, args, sample) if name == "parse" else bench_export_pdf(app, args, sample))
+
+    print(f"\n{'Benchmark':<28} {'median':>10} {'p95':>10} {'min':>10}")
+    for result in results:
+        print(f"{result['name']:<28} {result['median'] * 1000:8.2f}ms {result['p95'] * 1000:8.2f}ms "
+              f"{result['min'] * 1000:8.2f}ms")
+    peak_rss = app.peak_rss_bytes()
+
+    run = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "peak_rss_bytes": peak_rss,
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "output_dir")},
+        "results": results,
+    }
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{run['git_commit'] or 'nogit'}.json"
+    output_path.write_text(json.dumps(run, indent=2), encoding="utf-8")
+    print(f"\nSaved {output_path}" + (f" (peak memory {peak_rss / (1024 * 1024):.0f} MB)" if peak_rss else ""))
+
+    baseline_path = Path(args.compare) if args.compare else latest_result(output_dir, exclude=output_path)
+    if baseline_path is None:
+        return 0
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    baseline["path"] = str(baseline_path)
+    regressions = compare(run, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than {args.threshold:.0%}: {', '.join(regressions)}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
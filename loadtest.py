@@ -0,0 +1,282 @@
+# Multi-session load test: drives the Streamlit app headlessly through AppTest against the stub client.
+#
+#   python loadtest.py --sessions 20 --ramp-up 10
+#   python loadtest.py --sessions 50 --shared-deck --slides 30          # a workshop uploading the same deck
+#   python loadtest.py --sessions 10 --stub-latency 2 --stub-token-rate 50 --output loadtest.json
+#
+# Every simulated session opens the app, uploads a synthetic deck, waits for its evaluation job,
+# then opens each results section in turn. The report covers throughput, per-session latency
+# distributions, peak memory and thread counts, so instances can be sized and regressions in
+# the session/rerun path caught.
+#
+# All sessions share one process, like sessions on one server: the evaluation jobs, caches,
+# rate limiter and in-flight sharing are the app's own.
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+APP_PATH = Path(__file__).parent / "app.py"
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+# Script each AppTest session runs: app.py with the Anthropic client replaced by the stub.
+# AppTest executes this function's source on its own, so it only uses its arguments.
+def _stub_app_script(app_path, latency, token_rate, output_tokens, error_rate):
+    import runpy
+    import anthropic
+    import stub_client
+    anthropic.Anthropic = lambda **kwargs: stub_client.StubAnthropic(latency, token_rate, output_tokens, error_rate)
+    runpy.run_path(app_path, run_name="__main__")
+
+# Percentiles of a list of seconds
+def distribution(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": pick(0.5),
+        "p90": pick(0.9),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+    }
+
+# Samples the live thread count and resident memory of the process while the test runs
+class ResourceMonitor(threading.Thread):
+    def __init__(self, interval=0.25):
+        super().__init__(name="loadtest-monitor", daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    # Current resident memory in bytes, where /proc is available
+    @staticmethod
+    def rss_bytes():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append((time.monotonic(), threading.active_count(), self.rss_bytes()))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+# One simulated user: upload a deck, wait for the results, then browse every section
+class Session:
+    def __init__(self, index, deck, args):
+        self.index = index
+        self.deck = deck
+        self.args = args
+        self.reruns = []
+        self.tab_switches = []
+        self.submit_seconds = None
+        self.results_seconds = None
+        self.error = None
+
+    # Rerun the session's script, recording how long the rerun took. A rerun on the job screen
+    # lasts until the job finishes, because AppTest follows the screen's polling reruns itself.
+    def _run(self, at):
+        started = time.perf_counter()
+        at.run(timeout=self.args.run_timeout)
+        elapsed = time.perf_counter() - started
+        self.reruns.append(elapsed)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        return elapsed
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+        args = self.args
+        try:
+            at = AppTest.from_function(
+                _stub_app_script,
+                args=(str(APP_PATH), args.stub_latency, args.stub_token_rate, args.stub_output_tokens,
+                      args.stub_error_rate),
+                default_timeout=args.run_timeout,
+            )
+            self._run(at)
+            name, data, file_format = self.deck
+            at.file_uploader[0].set_value((name, data, MIME_TYPES[file_format]))
+            self._run(at)
+            evaluate = next(button for button in at.button if button.label == "Evaluate Pitch Deck")
+            started = time.perf_counter()
+            evaluate.click()
+            self._run(at)
+            self.submit_seconds = time.perf_counter() - started
+            # The job screen polls by rerunning until the results land in the session
+            deadline = time.monotonic() + args.session_timeout
+            while "evaluation_results" not in at.session_state:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"no results after {args.session_timeout:.0f}s")
+                failed = [e.value for e in at.error]
+                if failed and not any(button.label == "Retry failed sections" for button in at.button):
+                    raise RuntimeError(failed[0])
+                self._run(at)
+            self.results_seconds = time.perf_counter() - started
+            if not at.radio:
+                self._run(at)
+            for key in list(at.session_state["evaluation_results"])[1:]:
+                at.radio[0].set_value(key)
+                self.tab_switches.append(self._run(at))
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+
+# AppTest installs a mock Streamlit runtime singleton at the start of every script run and removes
+# it at the end, which breaks runs that overlap. Point AppTest at a subclass whose singleton writes
+# are redirected: the first mock becomes the shared runtime of every session, and it is never removed.
+def share_apptest_runtime():
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.testing.v1 import app_test
+
+    class SharedRuntimeSlot(type(Runtime)):
+        def __setattr__(cls, name, value):
+            if name != "_instance":
+                super().__setattr__(name, value)
+            elif value is not None and Runtime._instance is None:
+                Runtime._instance = value
+
+    app_test.Runtime = SharedRuntimeSlot("SharedRuntime", (Runtime,), {})
+
+# Build the deck each session uploads: one shared deck, or a distinct one per session
+def build_decks(args):
+    import synthetic_decks
+    decks = []
+    for index in range(args.sessions):
+        file_format = args.formats[index % len(args.formats)]
+        seed = 0 if args.shared_deck else index
+        data = synthetic_decks.make_deck(file_format, args.slides, seed)
+        decks.append((f"deck-{seed}.{file_format}", data, file_format))
+    return decks
+
+def report(sessions, monitor, wall_seconds, args):
+    finished = [s for s in sessions if s.results_seconds is not None]
+    failed = [s for s in sessions if s.error]
+    threads = [count for _, count, _ in monitor.samples]
+    rss = [value for _, _, value in monitor.samples if value]
+    try:
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        peak_rss = None
+    # Calls that reached the stub, from the app's usage ledger
+    api_calls = cost = 0
+    ledger_path = Path(os.environ["PITCHME_CACHE_DIR"]) / "ledger.sqlite3"
+    if ledger_path.exists():
+        with sqlite3.connect(ledger_path) as conn:
+            api_calls, cost = conn.execute("SELECT COUNT(*), COALESCE(SUM(cost_usd), 0) FROM usage").fetchone()
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "wall_seconds": wall_seconds,
+        "sessions": len(sessions),
+        "completed": len(finished),
+        "failed": len(failed),
+        "errors": sorted({s.error for s in failed}),
+        "evaluations_per_minute": len(finished) * 60 / wall_seconds if wall_seconds else 0,
+        "submit_seconds": distribution([s.submit_seconds for s in sessions if s.submit_seconds is not None]),
+        "time_to_results_seconds": distribution([s.results_seconds for s in finished]),
+        "rerun_seconds": distribution([t for s in sessions for t in s.reruns]),
+        "tab_switch_seconds": distribution([t for s in sessions for t in s.tab_switches]),
+        "threads": {"start": threads[0] if threads else None, "peak": max(threads) if threads else None},
+        "rss_bytes": {"peak_sampled": max(rss) if rss else None, "peak": peak_rss},
+        "api_calls": api_calls,
+        "simulated_cost_usd": cost,
+    }
+
+def print_report(result):
+    print(f"\n{result['completed']}/{result['sessions']} sessions completed in {result['wall_seconds']:.1f}s "
+          f"({result['evaluations_per_minute']:.1f} evaluations/min, {result['api_calls']} stub API calls)")
+    for error in result["errors"]:
+        print(f"  error: {error}")
+    print(f"\n{'Latency (s)':<22} {'count':>6} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for key, label in (("submit_seconds", "upload to job"), ("time_to_results_seconds", "upload to results"),
+                       ("rerun_seconds", "every rerun"), ("tab_switch_seconds", "tab switch")):
+        stats = result[key]
+        if stats:
+            print(f"{label:<22} {stats['count']:>6} {stats['p50']:8.3f} {stats['p90']:8.3f} {stats['p95']:8.3f} "
+                  f"{stats['p99']:8.3f} {stats['max']:8.3f}")
+    threads = result["threads"]
+    print(f"\nThreads: {threads['start']} at start, {threads['peak']} peak")
+    peak = result["rss_bytes"]["peak"]
+    if peak:
+        print(f"Peak memory: {peak / (1024 * 1024):.0f} MB")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app with concurrent headless sessions.")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of simulated sessions")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which the sessions start")
+    parser.add_argument("--slides", type=int, default=20, help="Slides per synthetic deck")
+    parser.add_argument("--formats", nargs="+", choices=sorted(MIME_TYPES), default=["pdf", "pptx", "docx"],
+                        help="Deck formats, assigned to sessions in turn")
+    parser.add_argument("--shared-deck", action="store_true",
+                        help="Every session uploads the same deck (exercises caching and in-flight sharing)")
+    parser.add_argument("--stub-latency", type=float, default=0.5, help="Stub seconds to first token")
+    parser.add_argument("--stub-token-rate", type=float, default=200.0, help="Stub output tokens per second")
+    parser.add_argument("--stub-output-tokens", type=int, default=800, help="Stub answer length in tokens")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Share of stub calls that fail")
+    parser.add_argument("--run-timeout", type=float, default=120.0, help="Seconds allowed for a single rerun")
+    parser.add_argument("--session-timeout", type=float, default=600.0, help="Seconds allowed for an evaluation")
+    parser.add_argument("--keep-rate-limits", action="store_true",
+                        help="Keep the app's client-side API rate limits instead of lifting them")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "stub")
+    os.environ["PITCHME_CACHE_DIR"] = tempfile.mkdtemp(prefix="pitchme-load-")
+    if not args.keep_rate_limits:
+        os.environ.setdefault("PITCHME_RATE_LIMIT_RPM", "100000")
+        os.environ.setdefault("PITCHME_RATE_LIMIT_TPM", "1000000000")
+    import streamlit
+    # Silence Streamlit's warnings about running outside `streamlit run`
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    share_apptest_runtime()
+    decks = build_decks(args)
+    sessions = [Session(index, deck, args) for index, deck in enumerate(decks)]
+    monitor = ResourceMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    threads = []
+    for session in sessions:
+        thread = threading.Thread(target=session.run, name=f"loadtest-session-{session.index}")
+        thread.start()
+        threads.append(thread)
+        if args.sessions > 1:
+            time.sleep(args.ramp_up / (args.sessions - 1) if session.index < args.sessions - 1 else 0)
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+    monitor.stop()
+
+    result = report(sessions, monitor, wall_seconds, args)
+    print_report(result)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print(f"Report written to {args.output}")
+    return 1 if result["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
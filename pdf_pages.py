@@ -0,0 +1,59 @@
+# Page-level PDF text extraction used by extract_text_from_pdf in app.py.
+# Kept in its own module, without Streamlit, so process-pool workers can import it cheaply.
+import hashlib
+from io import BytesIO
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+# Keys that never change a page's extracted text: the page tree back-reference and embedded font programs
+_SKIPPED_KEYS = {"/Parent", "/FontFile", "/FontFile2", "/FontFile3"}
+
+# Feed a PDF object into `digest`, resolving references. Objects reached through a reference are
+# hashed once per deck and remembered in `memo`, since every page shares the same fonts.
+def _hash_object(digest, obj, memo):
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref not in memo:
+            # Placeholder while the object is being hashed, in case it refers back to itself
+            memo[ref] = b"<cycle>"
+            inner = hashlib.sha256()
+            _hash_object(inner, obj.get_object(), memo)
+            memo[ref] = inner.digest()
+        digest.update(memo[ref])
+    elif isinstance(obj, DictionaryObject):
+        digest.update(b"<<")
+        for key in sorted(obj):
+            if key in _SKIPPED_KEYS:
+                continue
+            digest.update(str(key).encode("utf-8"))
+            _hash_object(digest, obj.raw_get(key), memo)
+        digest.update(b">>")
+        # Image data has no text in it
+        if isinstance(obj, StreamObject) and obj.get("/Subtype") != "/Image":
+            digest.update(obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"[")
+        for item in obj:
+            _hash_object(digest, item, memo)
+        digest.update(b"]")
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+
+# Hash of a page's content stream and the resources its text depends on (fonts with their
+# encodings and ToUnicode maps, form XObjects), used to reuse text from pages seen in earlier
+# uploads. Pass the same `memo` dict for every page of a deck to hash shared fonts only once.
+def page_content_hash(page, memo=None):
+    if memo is None:
+        memo = {}
+    digest = hashlib.sha256()
+    contents = page.get_contents()
+    digest.update(contents.get_data() if contents is not None else b"")
+    resources = page.raw_get("/Resources") if "/Resources" in page else None
+    if resources is not None:
+        _hash_object(digest, resources, memo)
+    return digest.hexdigest()
+
+# Extract the text of the given pages (runs in a worker process)
+def extract_pages(pdf_bytes, page_numbers):
+    pdf_reader = PdfReader(BytesIO(pdf_bytes))
+    return [pdf_reader.pages[i].extract_text() or "" for i in page_numbers]
@@ -0,0 +1,153 @@
+# Local stand-in for the Anthropic client, used to run PitchMe without network access or API spend.
+# It answers every request with a short canned analysis (including a mermaid diagram) and
+# reports token usage the same way the real messages API does. For benchmarks it can also
+# simulate time to first token, a generation rate, longer answers and API errors.
+import random
+import re
+import threading
+import time
+
+# Rough characters per token, matching the estimate used by app.py
+CHARS_PER_TOKEN = 4
+
+class StubUsage:
+    def __init__(self, input_tokens, output_tokens, cache_creation_input_tokens=0, cache_read_input_tokens=0):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_creation_input_tokens = cache_creation_input_tokens
+        self.cache_read_input_tokens = cache_read_input_tokens
+
+class StubTextBlock:
+    def __init__(self, text):
+        self.type = "text"
+        self.text = text
+
+class StubMessage:
+    def __init__(self, text, usage, stop_reason="end_turn"):
+        self.content = [StubTextBlock(text)]
+        self.usage = usage
+        self.stop_reason = stop_reason
+
+class StubTokenCount:
+    def __init__(self, input_tokens):
+        self.input_tokens = input_tokens
+
+# Error raised for injected failures, shaped like the SDK's APIStatusError so the
+# app's retry logic treats it the same way
+class StubAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Stub API error {status_code}")
+        self.status_code = status_code
+        self.response = None
+
+# Context manager returned by messages.stream, yielding the reply a few words at a time
+# after the first-token latency, at the configured token rate
+class StubStream:
+    def __init__(self, message, latency, token_rate):
+        self._message = message
+        self._latency = latency
+        self._token_rate = token_rate
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        if self._latency:
+            time.sleep(self._latency)
+        for chunk in re.findall(r"\S+\s*", self._message.content[0].text):
+            if self._token_rate:
+                time.sleep(len(chunk) / CHARS_PER_TOKEN / self._token_rate)
+            yield chunk
+
+    def get_final_message(self):
+        return self._message
+
+# Plain text of a system prompt or message content, which may be a string or a list of blocks
+def _content_text(content):
+    if isinstance(content, str):
+        return content
+    return "\n".join(block.get("text", "") for block in content)
+
+# latency: seconds before the first token. token_rate: output tokens per second (0 = instant).
+# output_tokens: pad each answer to about this many tokens. error_rate: share of calls that
+# fail with one of error_statuses before producing any output.
+class StubMessages:
+    def __init__(self, latency=0.0, token_rate=0.0, output_tokens=0, error_rate=0.0,
+                 error_statuses=(429, 500, 529), seed=None):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # Count the call and decide whether it fails
+    def _start_call(self):
+        with self._lock:
+            self.calls += 1
+            failed = self.error_rate and self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+                status = self._random.choice(self.error_statuses)
+        if failed:
+            if self.latency:
+                time.sleep(self.latency)
+            raise StubAPIError(status)
+
+    def _reply(self, request):
+        system = _content_text(request.get("system", ""))
+        prompt = "\n".join(_content_text(m["content"]) for m in request["messages"])
+        role = re.search(r"# Role\s*\n(.+)", prompt)
+        role = role.group(1).strip() if role else "Analyst"
+        text = (
+            f"## 🤖 Stub Analysis\n\n"
+            f"**Reviewer**: {role}\n\n"
+            f"- The request contained about {len(system) + len(prompt):,} characters of input.\n"
+            f"- This response was generated locally without calling the API.\n\n"
+            f"```mermaid\ngraph LR\n    A[Problem] --> B[Solution] --> C[Market]\n```\n\n"
+            f"| Area | Score |\n| ---- | ----- |\n| Overall | 7/10 |\n"
+        )
+        # Filler findings up to the requested answer length
+        finding = 0
+        while len(text) // CHARS_PER_TOKEN < self.output_tokens:
+            finding += 1
+            text += f"\n- **Finding {finding}**: The deck states its case clearly, but supporting evidence could be stronger."
+        # Answers longer than max_tokens are cut off, as the API does
+        stop_reason = "end_turn"
+        if len(text) // CHARS_PER_TOKEN > request["max_tokens"]:
+            text = text[:request["max_tokens"] * CHARS_PER_TOKEN]
+            stop_reason = "max_tokens"
+        usage = StubUsage(
+            input_tokens=-(-(len(system) + len(prompt)) // CHARS_PER_TOKEN),
+            output_tokens=-(-len(text) // CHARS_PER_TOKEN)
+        )
+        return StubMessage(text, usage, stop_reason)
+
+    def create(self, **request):
+        self._start_call()
+        message = self._reply(request)
+        generation = message.usage.output_tokens / self.token_rate if self.token_rate else 0
+        if self.latency or generation:
+            time.sleep(self.latency + generation)
+        return message
+
+    def stream(self, **request):
+        self._start_call()
+        return StubStream(self._reply(request), self.latency, self.token_rate)
+
+    def count_tokens(self, **request):
+        text = _content_text(request.get("system", "")) + "".join(
+            _content_text(m["content"]) for m in request["messages"]
+        )
+        return StubTokenCount(-(-len(text) // CHARS_PER_TOKEN))
+
+class StubAnthropic:
+    def __init__(self, latency=0.0, token_rate=0.0, output_tokens=0, error_rate=0.0, seed=None):
+        self.messages = StubMessages(latency, token_rate, output_tokens, error_rate, seed=seed)
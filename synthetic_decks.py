@@ -0,0 +1,137 @@
+# Synthetic pitch decks for benchmarks and load tests, built with the same libraries the app reads them with.
+#
+#   python synthetic_decks.py decks/ --slides 5 50 300 --formats pdf pptx docx
+#
+# Decks are deterministic for a given size and seed, so timings can be compared between runs.
+# Every slide has a title, a few bullets with figures and a repeated confidential footer,
+# which gives extraction and compaction realistic work to do.
+import argparse
+import random
+import sys
+from io import BytesIO
+from pathlib import Path
+
+FORMATS = ("pdf", "pptx", "docx")
+
+COMPANY = "Acme Robotics"
+TOPICS = [
+    "Problem", "Solution", "Why Now", "Market Size", "Product", "Business Model", "Traction",
+    "Go-To-Market", "Competition", "Team", "Financials", "Roadmap", "The Ask",
+]
+SUBJECTS = ["Warehouse operators", "Our customers", "Mid-size retailers", "Pilot sites", "Logistics teams", "Our platform"]
+VERBS = ["lose", "save", "spend", "generate", "reduce", "automate", "process"]
+OBJECTS = ["hours per week on manual picking", "of fulfilment costs", "orders per day", "in annual recurring revenue",
+           "support tickets per month", "of returns handled by hand"]
+
+# Uploaded-file stand-in for an in-memory deck, as the extractors expect from Streamlit
+class SyntheticUpload:
+    def __init__(self, name, data):
+        self.name = name
+        self._data = data
+        self.size = len(data)
+
+    def getvalue(self):
+        return self._data
+
+# Title and bullet lines of every slide of a deck
+def deck_slides(slides, seed=0):
+    rng = random.Random(seed * 100003 + slides)
+    content = []
+    for index in range(1, slides + 1):
+        topic = TOPICS[(index - 1) % len(TOPICS)]
+        title = f"{topic}" if index <= len(TOPICS) else f"{topic} ({index // len(TOPICS) + 1})"
+        bullets = [
+            f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.randint(2, 95)}% {rng.choice(OBJECTS)}"
+            for _ in range(rng.randint(3, 6))
+        ]
+        bullets.append(f"Key figure: ${rng.randint(1, 900)}M by {2025 + rng.randint(1, 6)}")
+        content.append((title, bullets))
+    return content
+
+def _footer(index):
+    return f"{COMPANY} - Strictly Confidential    {index}"
+
+def make_pdf_deck(slides, seed=0):
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.pdfgen import canvas
+    buffer = BytesIO()
+    width, height = landscape(letter)
+    pdf = canvas.Canvas(buffer, pagesize=(width, height))
+    for index, (title, bullets) in enumerate(deck_slides(slides, seed), 1):
+        pdf.setFont("Helvetica-Bold", 28)
+        pdf.drawString(54, height - 72, title)
+        pdf.setFont("Helvetica", 16)
+        for line, bullet in enumerate(bullets):
+            pdf.drawString(72, height - 130 - line * 30, f"- {bullet}")
+        pdf.setFont("Helvetica", 9)
+        pdf.drawString(54, 30, _footer(index))
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def make_pptx_deck(slides, seed=0):
+    from pptx import Presentation
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for index, (title, bullets) in enumerate(deck_slides(slides, seed), 1):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = title
+        body = slide.placeholders[1].text_frame
+        body.text = bullets[0]
+        for bullet in bullets[1:]:
+            body.add_paragraph().text = bullet
+        slide.notes_slide.notes_text_frame.text = f"Speaker notes for slide {index}: {bullets[0]}."
+    buffer = BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+def make_docx_deck(slides, seed=0):
+    from docx import Document
+    document = Document()
+    for index, (title, bullets) in enumerate(deck_slides(slides, seed), 1):
+        document.add_heading(title, level=1)
+        for bullet in bullets:
+            document.add_paragraph(bullet, style="List Bullet")
+        document.add_paragraph(_footer(index))
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+BUILDERS = {"pdf": make_pdf_deck, "pptx": make_pptx_deck, "docx": make_docx_deck}
+
+# Build one deck as bytes
+def make_deck(file_format, slides, seed=0):
+    return BUILDERS[file_format](slides, seed)
+
+# Build one deck as an upload object the app's extractors accept
+def make_upload(file_format, slides, seed=0):
+    return SyntheticUpload(f"synthetic-{slides}.{file_format}", make_deck(file_format, slides, seed))
+
+# Write a deck of every requested format and size to a directory and return their paths
+def write_decks(directory, slide_counts, formats=FORMATS, seed=0):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for slides in slide_counts:
+        for file_format in formats:
+            path = directory / f"synthetic-{slides}-slides-{seed}.{file_format}"
+            path.write_bytes(make_deck(file_format, slides, seed))
+            paths.append(path)
+    return paths
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic pitch decks for benchmarks and load tests.")
+    parser.add_argument("output_dir", help="Directory to write the decks to")
+    parser.add_argument("--slides", type=int, nargs="+", default=[5, 50, 300], help="Slide counts to generate")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS), help="File formats to generate")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the slide contents")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    for path in write_decks(args.output_dir, args.slides, args.formats, args.seed):
+        print(f"{path} ({path.stat().st_size / 1024:.0f} KB)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())